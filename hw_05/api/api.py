@@ -1,16 +1,20 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import json
 import datetime
+import functools
 import logging
 import hashlib
+import time
 import uuid
 from argparse import ArgumentParser
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 
 from scoring import get_score, get_interests
 import cache
+import metrics
+import serializers
+from metrics import timed
 
 SALT = "Otus"
 ADMIN_LOGIN = "admin"
@@ -122,21 +126,45 @@ class DateField(CharField):
         if value in self.blank_values:
             return value
         try:
-            return self.time2str(value, "%d.%m.%Y")
+            return self.parse_date(value)
         except ValueError:
             raise ValueError("Date like DD.MM.YYYY expected!")
 
+    def parse_date(self, value):
+        """
+        Fast path for the zero-padded DD.MM.YYYY form,
+        strptime for anything else (e.g. 1.7.2017)
+        """
+        if (
+            len(value) == 10
+            and value.isascii()
+            and value[2] == value[5] == "."
+            and value[:2].isdigit()
+            and value[3:5].isdigit()
+            and value[6:].isdigit()
+        ):
+            return datetime.date(int(value[6:]), int(value[3:5]), int(value[:2]))
+        return self.time2str(value, "%d.%m.%Y")
+
     def time2str(self, value, format):
         return datetime.datetime.strptime(value, format).date()
 
 
+@functools.lru_cache(maxsize=1)
+def birthday_cutoff(today):
+    """
+    The earliest birthday within 70 years: (today - birthday).days / 365.25 > 70
+    is the same as (today - birthday).days > 25567
+    :param today: current date, the cutoff is computed once per day
+    """
+    return today - datetime.timedelta(days=int(70 * 365.25))
+
+
 class BirthDayField(DateField):
 
     def validator(self, value):
         super().validator(value)
-        today = datetime.date.today()
-        delta = today - value
-        if delta.days / 365.25 > 70:
+        if value < birthday_cutoff(datetime.date.today()):
             raise ValueError("Date range more than 70 years!")
 
 
@@ -269,21 +297,24 @@ class OnlineScoreWorker:
 
     def processing(self, request, context, store):
         data = OnlineScoreRequest(request.arguments)
-        if not data.is_valid():
+        with timed(context, "validate"):
+            is_valid = data.is_valid()
+        if not is_valid:
             return data.errors, INVALID_REQUEST
 
         if request.is_admin:
             score = 42
         else:
-            score = get_score(
-                store,
-                data.phone,
-                data.email,
-                data.birthday,
-                data.gender,
-                data.first_name,
-                data.last_name,
-            )
+            with timed(context, "store"):
+                score = get_score(
+                    store,
+                    data.phone,
+                    data.email,
+                    data.birthday,
+                    data.gender,
+                    data.first_name,
+                    data.last_name,
+                )
         context["has"] = data.non_empty_fields
         return {"score": score}, OK
 
@@ -292,11 +323,14 @@ class ClientsInterestsWorker:
 
     def processing(self, request, context, store):
         data = ClientsInterestsRequest(request.arguments)
-        if not data.is_valid():
+        with timed(context, "validate"):
+            is_valid = data.is_valid()
+        if not is_valid:
             return data.errors, INVALID_REQUEST
 
         context["nclients"] = len(data.client_ids)
-        response = {cid: get_interests(store, cid) for cid in data.client_ids}
+        with timed(context, "store"):
+            response = {cid: get_interests(store, cid) for cid in data.client_ids}
         return response, OK
 
 
@@ -307,9 +341,13 @@ def method_handler(request, ctx, store):
     }
 
     data = MethodRequest(request["body"])
-    if not data.is_valid():
+    with timed(ctx, "validate"):
+        is_valid = data.is_valid()
+    if not is_valid:
         return data.errors, INVALID_REQUEST
-    if not check_auth(data):
+    with timed(ctx, "auth"):
+        is_authorized = check_auth(data)
+    if not is_authorized:
         return "Forbidden", FORBIDDEN
 
     handler = methods_list[data.method]()
@@ -320,44 +358,98 @@ class MainHTTPHandler(BaseHTTPRequestHandler):
     router = {"method": method_handler}
     # store = None
     store = cache.Storage(cache.RedisStorage())
+    serializer = serializers.get_serializer()
+    registry = metrics.Registry()
+    # HTTP/1.1 keep-alive: every response is framed by Content-Length,
+    # idle connections are closed after `timeout` seconds
+    # and after `max_requests` requests
+    protocol_version = "HTTP/1.1"
+    timeout = 15
+    max_requests = 100
+    # headers and body are written separately, do not let Nagle delay the body
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.requests_handled = 0
 
     def get_request_id(self, headers):
         return headers.get("HTTP_X_REQUEST_ID", uuid.uuid4().hex)
 
+    def write_response(self, code, content_type, body):
+        """
+        Sends a response framed by Content-Length
+        and closes the connection after max_requests
+        """
+        self.requests_handled += 1
+        if self.requests_handled >= self.max_requests:
+            self.close_connection = True
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.strip("/") != "metrics":
+            self.send_error(NOT_FOUND)
+            return
+        body = self.registry.render(self.store).encode("utf-8")
+        self.write_response(OK, metrics.CONTENT_TYPE, body)
+
     def do_POST(self):
+        started = time.perf_counter()
         response, code = {}, OK
         context = {"request_id": self.get_request_id(self.headers)}
         request = None
         try:
-            data_string = self.rfile.read(int(self.headers["Content-Length"]))
-            request = json.loads(data_string)
-        except:
+            content_length = int(self.headers["Content-Length"])
+            if content_length < 0:
+                # rfile.read(-1) would wait for the client to close the connection
+                raise ValueError(content_length)
+        except (TypeError, ValueError):
+            # Without a valid length the next pipelined request can't be found
+            content_length = None
+            self.close_connection = True
             code = BAD_REQUEST
+        if content_length is not None:
+            try:
+                with timed(context, "read"):
+                    data_string = self.rfile.read(content_length)
+                with timed(context, "parse"):
+                    request = self.serializer.loads(data_string)
+            except:
+                code = BAD_REQUEST
 
         if request:
             path = self.path.strip("/")
-            logging.info("%s: %s %s" % (self.path, data_string, context["request_id"]))
+            logging.info("%s: %s %s", self.path, data_string, context["request_id"])
             if path in self.router:
                 try:
                     response, code = self.router[path](
                         {"body": request, "headers": self.headers}, context, self.store
                     )
                 except Exception as e:
-                    logging.exception("Unexpected error: %s" % e)
+                    logging.exception("Unexpected error: %s", e)
                     code = INTERNAL_ERROR
             else:
                 code = NOT_FOUND
 
-        self.send_response(code)
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
         if code not in ERRORS:
             r = {"response": response, "code": code}
         else:
             r = {"error": response or ERRORS.get(code, "Unknown Error"), "code": code}
-        context.update(r)
-        logging.info(context)
-        self.wfile.write(json.dumps(r).encode("utf-8"))
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            context.update(r)
+            logging.info(context)
+        with timed(context, "serialize"):
+            body = self.serializer.dumps(r)
+        self.write_response(code, "application/json", body)
+
+        context["timings"]["total"] = time.perf_counter() - started
+        self.registry.observe_request(context, code)
         return
 
 
@@ -365,15 +457,34 @@ if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("-p", "--port", action="store", type=int, default=8080)
     parser.add_argument("-l", "--log", action="store", default=None)
+    parser.add_argument(
+        "-s", "--serializer", choices=sorted(serializers.SERIALIZERS), default=None
+    )
+    parser.add_argument(
+        "--keepalive-timeout",
+        action="store",
+        type=float,
+        default=MainHTTPHandler.timeout,
+    )
+    parser.add_argument(
+        "--max-requests",
+        action="store",
+        type=int,
+        default=MainHTTPHandler.max_requests,
+    )
     args = parser.parse_args()
+    MainHTTPHandler.serializer = serializers.get_serializer(args.serializer)
+    MainHTTPHandler.timeout = args.keepalive_timeout
+    MainHTTPHandler.max_requests = args.max_requests
     logging.basicConfig(
         filename=args.log,
         level=logging.INFO,
         format="[%(asctime)s] %(levelname).1s %(message)s",
         datefmt="%Y.%m.%d %H:%M:%S",
     )
-    server = HTTPServer(("localhost", args.port), MainHTTPHandler)
-    logging.info("Starting server at %s" % args.port)
+    # One thread per connection: an idle keep-alive client must not block others
+    server = ThreadingHTTPServer(("localhost", args.port), MainHTTPHandler)
+    logging.info("Starting server at %s", args.port)
     try:
         server.serve_forever()
     except KeyboardInterrupt:
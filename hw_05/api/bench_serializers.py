@@ -0,0 +1,55 @@
+"""
+Benchmark of the JSON serializers on typical scoring API payloads
+Usage: python bench_serializers.py [-n NUMBER]
+"""
+
+import timeit
+from argparse import ArgumentParser
+
+import serializers
+
+ONLINE_SCORE_REQUEST = (
+    b'{"account": "horns&hoofs", "login": "h&f", "method": "online_score", '
+    b'"token": "55cc9ce545bcd144300fe9efc28e65d415b923ebb6be1e19d2750a2c03e80dd2'
+    b'09a27dd5d5d8e4f1c8ca5b4da9ab4a5a5d1b8da5e7c0c6de1c0f8d0e08b6a1b1d7", '
+    b'"arguments": {"phone": "79175002040", "email": "stupnikov@otus.ru", '
+    b'"first_name": "Stanislav", "last_name": "Stupnikov", '
+    b'"birthday": "01.01.1990", "gender": 1}}'
+)
+ONLINE_SCORE_RESPONSE = {"response": {"score": 5.0}, "code": 200}
+CLIENTS_INTERESTS_RESPONSE = {
+    "response": {cid: ["cinema", "tv", "books"] for cid in range(20)},
+    "code": 200,
+}
+
+
+def bench(serializer, number):
+    """
+    :return: microseconds per loads, dumps(score), dumps(interests) call
+    """
+    return tuple(
+        timeit.timeit(stmt, number=number) / number * 1e6
+        for stmt in (
+            lambda: serializer.loads(ONLINE_SCORE_REQUEST),
+            lambda: serializer.dumps(ONLINE_SCORE_RESPONSE),
+            lambda: serializer.dumps(CLIENTS_INTERESTS_RESPONSE),
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("-n", "--number", action="store", type=int, default=100000)
+    args = parser.parse_args()
+
+    results = {
+        name: bench(serializers.get_serializer(name), args.number)
+        for name in serializers.SERIALIZERS
+    }
+    base = sum(results["json"])
+    print(f"{'backend':<8} {'loads':>9} {'dumps':>9} {'interests':>10} {'speedup':>8}")
+    for name, (loads, dumps, interests) in results.items():
+        print(
+            f"{name:<8} {loads:>7.2f}us {dumps:>7.2f}us {interests:>8.2f}us "
+            f"{base / (loads + dumps + interests):>7.1f}x"
+        )
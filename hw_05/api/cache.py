@@ -1,20 +1,247 @@
-import redis
+import asyncio
 import functools
+import logging
+import random
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import redis
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of calling Redis while the circuit breaker is open"""
+
+
+class Stats:
+    """Thread-safe named counters, the names are listed in FIELDS"""
+
+    FIELDS = ()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        for name in self.FIELDS:
+            setattr(self, name, 0)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self):
+        with self._lock:
+            return {name: getattr(self, name) for name in self.FIELDS}
+
+
+class RetryStats(Stats):
+    """
+    Counters of the resilience layer
+    retries - repeated attempts after a failed call
+    rejections - calls rejected by the open circuit without touching Redis
+    failures - calls that failed after all attempts
+    """
+
+    FIELDS = ("retries", "rejections", "failures")
+
+
+class CacheStats(Stats):
+    """
+    Counters of cache lookups
+    hits - values found in the cache, stale ones included
+    misses - values not found or not readable
+    stale - stale values served while a refresh runs
+    """
+
+    FIELDS = ("hits", "misses", "stale")
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for the key-value store
+    CLOSED - calls go through, consecutive failures are counted
+    OPEN - calls are rejected at once until recovery_timeout passes
+    HALF_OPEN - a single trial call decides whether to close or reopen
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self, failure_threshold=5, recovery_timeout=30.0, clock=time.monotonic
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if (
+                self._state == self.OPEN
+                and self.clock() - self._opened_at >= self.recovery_timeout
+            ):
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """
+        Checks whether a call may be made now
+        :return: True for CLOSED state or for the single HALF_OPEN trial call
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self.clock() - self._opened_at < self.recovery_timeout:
+                return False
+            if self._trial_running:
+                return False
+            self._state = self.HALF_OPEN
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def release(self):
+        """
+        Ends a call that failed with an error saying nothing about the availability
+        of the store (e.g. WRONGTYPE), so the next half-open trial is allowed
+        """
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if (
+                self._state == self.HALF_OPEN
+                or self._failures >= self.failure_threshold
+            ):
+                self._state = self.OPEN
+                self._opened_at = self.clock()
+
+
+class RetryPolicy:
+    """
+    Retries a call with exponential backoff and full jitter
+    (random delay in [0, min(max_delay, backoff_factor * 2**attempt)]).
+    Calls are made through the circuit breaker when it is given,
+    so an unavailable store is rejected at once without any sleeping.
+    The last error is raised after all attempts.
+    """
+
+    def __init__(
+        self,
+        exceptions,
+        attempts=3,
+        backoff_factor=0.3,
+        max_delay=1.0,
+        breaker=None,
+        stats=None,
+    ):
+        self.exceptions = exceptions
+        self.attempts = attempts
+        self.backoff_factor = backoff_factor
+        self.max_delay = max_delay
+        self.breaker = breaker
+        self.stats = stats if stats is not None else RetryStats()
+
+    def delay(self, attempt):
+        return random.uniform(
+            0, min(self.max_delay, self.backoff_factor * (2**attempt))
+        )
+
+    def _before_attempt(self):
+        if self.breaker is not None and not self.breaker.allow():
+            self.stats.incr("rejections")
+            raise CircuitOpenError("Circuit breaker is open")
+
+    def _on_success(self):
+        if self.breaker is not None:
+            self.breaker.record_success()
+
+    def _on_failure(self, attempt):
+        """
+        :return: True if one more attempt should be made
+        """
+        if self.breaker is not None:
+            self.breaker.record_failure()
+        if attempt + 1 >= self.attempts:
+            self.stats.incr("failures")
+            return False
+        self.stats.incr("retries")
+        return True
+
+    def _on_error(self):
+        if self.breaker is not None:
+            self.breaker.release()
+
+    def call(self, func, *args, **kwargs):
+        for attempt in range(self.attempts):
+            self._before_attempt()
+            try:
+                result = func(*args, **kwargs)
+            except self.exceptions:
+                if not self._on_failure(attempt):
+                    raise
+                time.sleep(self.delay(attempt))
+            except BaseException:
+                self._on_error()
+                raise
+            else:
+                self._on_success()
+                return result
+
+    async def acall(self, func, *args, **kwargs):
+        for attempt in range(self.attempts):
+            self._before_attempt()
+            try:
+                result = await func(*args, **kwargs)
+            except self.exceptions:
+                if not self._on_failure(attempt):
+                    raise
+                await asyncio.sleep(self.delay(attempt))
+            except BaseException:
+                self._on_error()
+                raise
+            else:
+                self._on_success()
+                return result
 
 
 # https://stackoverflow.com/questions/50246304/using-python-decorators-to-retry-request
-def retry(exceptions, attempts=3, backoff_factor=0.3):
+def retry(exceptions, attempts=3, backoff_factor=0.3, **policy_kwargs):
+    policy = RetryPolicy(exceptions, attempts, backoff_factor, **policy_kwargs)
+
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            for attempt in range(attempts):
-                try:
-                    return func(*args, **kwargs)
-                except exceptions:
-                    delay = backoff_factor * (2**attempt)
-                    time.sleep(delay)
+            return policy.call(func, *args, **kwargs)
 
+        wrapper.policy = policy
+        return wrapper
+
+    return decorator
+
+
+def async_retry(exceptions, attempts=3, backoff_factor=0.3, **policy_kwargs):
+    policy = RetryPolicy(exceptions, attempts, backoff_factor, **policy_kwargs)
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await policy.acall(func, *args, **kwargs)
+
+        wrapper.policy = policy
         return wrapper
 
     return decorator
@@ -48,6 +275,23 @@ class RedisStorage:
         except redis.exceptions.ConnectionError:
             raise ConnectionError
 
+    def get_with_ttl(self, key):
+        """
+        Get value and its remaining time of life from Redis in one round trip
+        :param key: record key to extract
+        :return: (value, ttl in seconds or None if the key has no expiry)
+        """
+        try:
+            pipe = self.db.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.ttl(key)
+            value, ttl = pipe.execute()
+        except redis.exceptions.TimeoutError:
+            raise TimeoutError
+        except redis.exceptions.ConnectionError:
+            raise ConnectionError
+        return value, (ttl if ttl is not None and ttl >= 0 else None)
+
     def set(self, key, value, expires=None):
         """
         Set value to Redis
@@ -63,6 +307,36 @@ class RedisStorage:
         except redis.exceptions.ConnectionError:
             raise ConnectionError
 
+    def hget(self, key, field):
+        """
+        Get a field of a Redis hash
+        :param key: hash key
+        :param field: field of the hash
+        :return: field value or None
+        """
+        try:
+            return self.db.hget(key, field)
+        except redis.exceptions.TimeoutError:
+            raise TimeoutError
+        except redis.exceptions.ConnectionError:
+            raise ConnectionError
+
+    def hset_many(self, mapping):
+        """
+        Set fields of several Redis hashes in one pipelined round trip
+        :param mapping: {hash key: {field: value}}
+        :return: number of added fields
+        """
+        try:
+            pipe = self.db.pipeline(transaction=False)
+            for key, fields in mapping.items():
+                pipe.hset(key, mapping=fields)
+            return sum(pipe.execute())
+        except redis.exceptions.TimeoutError:
+            raise TimeoutError
+        except redis.exceptions.ConnectionError:
+            raise ConnectionError
+
     def delete(self, key):
         """
         Delete a key from Redis cache.
@@ -85,37 +359,189 @@ class RedisStorage:
 class Storage:
     MAX_RETRIES = 3
     BACKOFF_FACTOR = 0.3
+    MAX_DELAY = 1.0
+    FAILURE_THRESHOLD = 5
+    RECOVERY_TIMEOUT = 30.0
+    STORE_ERRORS = (TimeoutError, ConnectionError)
+    REFRESH_WORKERS = 4
 
-    def __init__(self, storage):
+    def __init__(self, storage, breaker=None, stats=None):
         self.storage = storage
+        self.breaker = breaker or CircuitBreaker(
+            self.FAILURE_THRESHOLD, self.RECOVERY_TIMEOUT
+        )
+        self.stats = stats if stats is not None else RetryStats()
+        self.cache_stats = CacheStats()
+        self.policy = RetryPolicy(
+            self.STORE_ERRORS,
+            self.MAX_RETRIES,
+            self.BACKOFF_FACTOR,
+            max_delay=self.MAX_DELAY,
+            breaker=self.breaker,
+            stats=self.stats,
+        )
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._executor = None
 
     def get(self, key):
         """
         Gets persistent data from Redis (like a store)
+        Fails fast with CircuitOpenError while Redis is known to be down
         :param key: key of data content
         :return: data with particular key
         """
+        return self._guarded(self.storage.get, key)
+
+    def get_field(self, key, field):
+        """
+        Gets a field of a persistent Redis hash
+        Fails fast with CircuitOpenError while Redis is known to be down
+        :param key: hash key
+        :param field: field of the hash
+        :return: field value or None
+        """
+        return self._guarded(self.storage.hget, key, field)
+
+    def set_fields(self, mapping):
+        """
+        Sets fields of persistent Redis hashes with retries
+        :param mapping: {hash key: {field: value}}
+        :return: number of added fields
+        """
+        return self.policy.call(self.storage.hset_many, mapping)
 
-        return self.storage.get(key)
+    def _guarded(self, func, *args):
+        """
+        Single call through the circuit breaker without retries
+        """
+        if not self.breaker.allow():
+            self.stats.incr("rejections")
+            raise CircuitOpenError("Circuit breaker is open")
+        try:
+            result = func(*args)
+        except self.STORE_ERRORS:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
+        return result
 
-    @retry((TimeoutError, ConnectionError), MAX_RETRIES, BACKOFF_FACTOR)
     def cache_get(self, key):
         """
         Gets cached data from Redis (Redis like a cache)
-        Use @retry decorator for Redis access attempts
+        Redis access attempts are made through the retry policy,
+        an unavailable cache is a cache miss
         :param key: key of cached data
-        :return: cached data with particular key
+        :return: cached data with particular key or None
         """
-        return self.storage.get(key)
+        try:
+            value = self.policy.call(self.storage.get, key)
+        except self.STORE_ERRORS as e:
+            logging.warning("Cache get %s failed: %r", key, e)
+            value = None
+        self.cache_stats.incr("misses" if value is None else "hits")
+        return value
 
-    @retry((TimeoutError, ConnectionError), MAX_RETRIES, BACKOFF_FACTOR)
     def cache_set(self, key, value, expires=None):
         """
         Sets data to Redis cache
-        Use @retry decorator for Redis access attempts
+        Redis access attempts are made through the retry policy,
+        an unavailable cache is ignored
         :param key: key of cached data
         :param value: cashed data to set
         :param expires: time of life
-        :return:
+        :return: result of operation or None
         """
-        return self.storage.set(key, value, expires=expires)
+        try:
+            return self.policy.call(self.storage.set, key, value, expires=expires)
+        except self.STORE_ERRORS as e:
+            logging.warning("Cache set %s failed: %r", key, e)
+            return None
+
+    def cache_get_or_set(self, key, compute, expires, stale_ttl=0):
+        """
+        Read-through cache with request coalescing and stale-while-revalidate
+        Only one compute() per key runs at a time in the process, concurrent
+        callers wait for its result. The key lives in Redis for
+        expires + stale_ttl seconds; during the last stale_ttl seconds the
+        cached value is still served while a single background refresh
+        recomputes it.
+        :param key: key of cached data
+        :param compute: callable without arguments producing a fresh value
+        :param expires: time of life of a fresh value
+        :param stale_ttl: time a stale value may be served while refreshing
+        :return: cached or computed value
+        """
+        try:
+            value, ttl = self.policy.call(self.storage.get_with_ttl, key)
+        except self.STORE_ERRORS as e:
+            logging.warning("Cache get %s failed: %r", key, e)
+            value, ttl = None, None
+
+        if value is None:
+            self.cache_stats.incr("misses")
+            return self._single_flight(
+                key, lambda: self._compute_and_set(key, compute, expires, stale_ttl)
+            )
+        self.cache_stats.incr("hits")
+        if stale_ttl and ttl is not None and ttl < stale_ttl:
+            self.cache_stats.incr("stale")
+            self._refresh_in_background(key, compute, expires, stale_ttl)
+        return value
+
+    def _compute_and_set(self, key, compute, expires, stale_ttl):
+        value = compute()
+        self.cache_set(key, value, expires + stale_ttl)
+        return value
+
+    def _start_flight(self, key):
+        """
+        :return: (future of the running computation, True if the caller leads it)
+        """
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+
+    def _run_flight(self, key, future, func):
+        try:
+            future.set_result(func())
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def _single_flight(self, key, func):
+        future, leader = self._start_flight(key)
+        if leader:
+            self._run_flight(key, future, func)
+        return future.result()
+
+    def _refresh_in_background(self, key, compute, expires, stale_ttl):
+        future, leader = self._start_flight(key)
+        if not leader:
+            return
+        if self._executor is None:
+            with self._inflight_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        self.REFRESH_WORKERS, thread_name_prefix="cache-refresh"
+                    )
+        future.add_done_callback(self._log_refresh_error)
+        self._executor.submit(
+            self._run_flight,
+            key,
+            future,
+            lambda: self._compute_and_set(key, compute, expires, stale_ttl),
+        )
+
+    @staticmethod
+    def _log_refresh_error(future):
+        if future.exception() is not None:
+            logging.error("Background cache refresh failed: %r", future.exception())
@@ -0,0 +1,109 @@
+"""
+Compact storage of client interests
+Interests come from a fixed vocabulary, so a client's set of interests is
+stored as an integer bitmask (bit i means INTERESTS[i]). Clients are grouped
+into Redis hashes of BUCKET_SIZE fields: "ib:{cid // BUCKET_SIZE}" with field
+"{cid % BUCKET_SIZE}", small enough for Redis to keep them in the compact
+listpack encoding (hash-max-listpack-entries is 128 by default).
+Usage: python interests.py interests.jsonl
+where every line is {"cid": 1, "interests": ["cars", "tv"]}
+"""
+
+import functools
+import json
+import logging
+from argparse import ArgumentParser
+from itertools import islice
+
+INTERESTS = (
+    "cars",
+    "pets",
+    "travel",
+    "hi-tech",
+    "sport",
+    "music",
+    "books",
+    "tv",
+    "cinema",
+    "geek",
+    "otus",
+)
+INTEREST_BITS = {name: 1 << bit for bit, name in enumerate(INTERESTS)}
+BUCKET_SIZE = 100
+KEY_PREFIX = "ib:"
+
+
+def interests_location(cid):
+    """
+    :return: (hash key, field) of the client's interests
+    """
+    bucket, field = divmod(int(cid), BUCKET_SIZE)
+    return f"{KEY_PREFIX}{bucket}", str(field)
+
+
+def encode_interests(interests):
+    """
+    :param interests: iterable of names from INTERESTS
+    :return: bitmask
+    """
+    mask = 0
+    for name in interests:
+        try:
+            mask |= INTEREST_BITS[name]
+        except KeyError:
+            raise ValueError(f"Unknown interest: {name}")
+    return mask
+
+
+@functools.lru_cache(maxsize=4096)
+def decode_interests(mask):
+    """
+    :param mask: bitmask as int or as the decimal string read from Redis
+    :return: tuple of interest names in vocabulary order
+    """
+    mask = int(mask)
+    return tuple(name for name, bit in INTEREST_BITS.items() if mask & bit)
+
+
+def load_interests(store, items, chunk_size=10000):
+    """
+    Bulk loader: writes interests in pipelined batches
+    :param store: cache.Storage
+    :param items: iterable of (cid, list of interests)
+    :param chunk_size: clients per round trip
+    :return: number of loaded clients
+    """
+    loaded = 0
+    items = iter(items)
+    while chunk := list(islice(items, chunk_size)):
+        mapping = {}
+        for cid, names in chunk:
+            key, field = interests_location(cid)
+            mapping.setdefault(key, {})[field] = encode_interests(names)
+        store.set_fields(mapping)
+        loaded += len(chunk)
+    return loaded
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                yield record["cid"], record["interests"]
+
+
+if __name__ == "__main__":
+    import cache
+
+    parser = ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--host", action="store", default="localhost")
+    parser.add_argument("--port", action="store", type=int, default=6380)
+    parser.add_argument("--chunk-size", action="store", type=int, default=10000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    storage = cache.Storage(cache.RedisStorage(args.host, args.port))
+    count = load_interests(storage, read_jsonl(args.path), args.chunk_size)
+    logging.info("Loaded interests of %s clients", count)
@@ -0,0 +1,259 @@
+"""
+Load generator for the scoring API without a real Redis
+Drives method_handler with a mix of online_score and clients_interests
+requests against an in-process fake store with injected latency and
+failures, reports latency percentiles and throughput.
+Usage: python loadtest.py -n 10000 -c 8 --latency 0.001 --failure-rate 0.01
+"""
+
+import datetime
+import hashlib
+import random
+import statistics
+import threading
+import time
+from argparse import ArgumentParser
+from collections import Counter
+
+import api
+import cache
+from interests import INTERESTS, load_interests
+
+
+class FakeRedisStorage:
+    """
+    In-process replacement of cache.RedisStorage
+    :param latency: mean delay of every call in seconds (exponentially distributed)
+    :param failure_rate: share of calls failing with ConnectionError/TimeoutError
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def _call(self):
+        with self._lock:
+            delay = self._random.expovariate(1 / self.latency) if self.latency else 0
+            failed = self._random.random() < self.failure_rate
+            error = self._random.choice((ConnectionError, TimeoutError))
+        if delay:
+            time.sleep(delay)
+        if failed:
+            raise error
+
+    def _alive(self, key):
+        """
+        :return: (value, expires_at) of a not expired key or (None, None)
+        """
+        value, expires_at = self._data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            return None, None
+        return value, expires_at
+
+    def get(self, key):
+        self._call()
+        with self._lock:
+            return self._alive(key)[0]
+
+    def get_with_ttl(self, key):
+        self._call()
+        with self._lock:
+            value, expires_at = self._alive(key)
+        if expires_at is None:
+            return value, None
+        return value, int(expires_at - time.monotonic())
+
+    def set(self, key, value, expires=None):
+        self._call()
+        expires_at = time.monotonic() + expires if expires else None
+        with self._lock:
+            self._data[key] = (str(value), expires_at)
+        return True
+
+    def hget(self, key, field):
+        self._call()
+        with self._lock:
+            fields = self._alive(key)[0]
+            return fields.get(field) if fields else None
+
+    def hset_many(self, mapping):
+        self._call()
+        added = 0
+        with self._lock:
+            for key, fields in mapping.items():
+                stored = self._data.setdefault(key, ({}, None))[0]
+                added += len(fields.keys() - stored.keys())
+                stored.update((f, str(v)) for f, v in fields.items())
+        return added
+
+    def delete(self, key):
+        self._call()
+        with self._lock:
+            return int(self._data.pop(key, None) is not None)
+
+    def exists(self, key):
+        self._call()
+        with self._lock:
+            return int(self._alive(key)[0] is not None)
+
+
+def make_token(account, login):
+    if login == api.ADMIN_LOGIN:
+        msg = datetime.datetime.now().strftime("%Y%m%d%H") + api.ADMIN_SALT
+    else:
+        msg = account + login + api.SALT
+    return hashlib.sha512(msg.encode("utf-8")).hexdigest()
+
+
+class Workload:
+    """
+    Realistic request mix: score requests for a bounded pool of users
+    (so repeated users hit the cache) and interests requests for 1-10 clients
+    """
+
+    def __init__(self, score_ratio=0.8, users=1000, clients=10000, seed=None):
+        self.score_ratio = score_ratio
+        self.users = users
+        self.clients = clients
+        self._random = random.Random(seed)
+        self._token = make_token("horns&hoofs", "h&f")
+
+    def seed_store(self, store):
+        """
+        :param store: cache.Storage
+        """
+        load_interests(
+            store,
+            ((cid, self._random.sample(INTERESTS, 2)) for cid in range(self.clients)),
+        )
+
+    def score_arguments(self):
+        user = self._random.randrange(self.users)
+        arguments = {
+            "phone": f"7{user:010d}",
+            "email": f"user{user}@otus.ru",
+            "first_name": f"name{user}",
+            "last_name": f"surname{user}",
+        }
+        if user % 2:
+            arguments["gender"] = user % 3
+            arguments["birthday"] = f"{user % 28 + 1:02d}.01.{1960 + user % 50}"
+        return arguments
+
+    def next_request(self):
+        """
+        :return: (method name, request body)
+        """
+        if self._random.random() < self.score_ratio:
+            method, arguments = "online_score", self.score_arguments()
+        else:
+            method = "clients_interests"
+            arguments = {
+                "client_ids": self._random.sample(
+                    range(self.clients), self._random.randint(1, 10)
+                ),
+                "date": "20.07.2017",
+            }
+        return method, {
+            "account": "horns&hoofs",
+            "login": "h&f",
+            "method": method,
+            "token": self._token,
+            "arguments": arguments,
+        }
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run(store, workload, requests=10000, concurrency=8):
+    """
+    Runs `requests` calls of api.method_handler in `concurrency` threads
+    :return: report dict with latencies in milliseconds
+    """
+    latencies = []
+    codes = Counter()
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        local_latencies, local_codes = [], Counter()
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    break
+                method, body = workload.next_request()
+            start = time.perf_counter()
+            try:
+                _, code = api.method_handler({"body": body, "headers": {}}, {}, store)
+            except (ConnectionError, TimeoutError):
+                code = api.INTERNAL_ERROR
+            local_latencies.append(time.perf_counter() - start)
+            local_codes[(method, code)] += 1
+        with lock:
+            latencies.extend(local_latencies)
+            codes.update(local_codes)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "elapsed": elapsed,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "mean": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "p50": percentile(latencies, 50) * 1000,
+        "p95": percentile(latencies, 95) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+        "max": latencies[-1] * 1000 if latencies else 0.0,
+        "codes": dict(codes),
+    }
+
+
+def print_report(report, stats):
+    print(f"requests: {report['requests']} in {report['elapsed']:.2f}s")
+    print(f"rps:      {report['rps']:.0f}")
+    print(
+        "latency:  mean {mean:.3f}ms p50 {p50:.3f}ms p95 {p95:.3f}ms "
+        "p99 {p99:.3f}ms max {max:.3f}ms".format(**report)
+    )
+    for (method, code), count in sorted(report["codes"].items()):
+        print(f"  {method:<18} {code}: {count}")
+    print(f"store:    {stats}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("-n", "--requests", action="store", type=int, default=10000)
+    parser.add_argument("-c", "--concurrency", action="store", type=int, default=8)
+    parser.add_argument("--score-ratio", action="store", type=float, default=0.8)
+    parser.add_argument("--users", action="store", type=int, default=1000)
+    parser.add_argument("--clients", action="store", type=int, default=10000)
+    parser.add_argument("--latency", action="store", type=float, default=0.0)
+    parser.add_argument("--failure-rate", action="store", type=float, default=0.0)
+    parser.add_argument("--seed", action="store", type=int, default=None)
+    args = parser.parse_args()
+
+    workload = Workload(args.score_ratio, args.users, args.clients, args.seed)
+    fake_redis = FakeRedisStorage(seed=args.seed)
+    store = cache.Storage(fake_redis)
+    workload.seed_store(store)
+    fake_redis.latency = args.latency
+    fake_redis.failure_rate = args.failure_rate
+
+    report = run(store, workload, args.requests, args.concurrency)
+    print_report(report, store.stats.as_dict())
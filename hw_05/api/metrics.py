@@ -0,0 +1,133 @@
+"""
+In-process request metrics of the scoring API in Prometheus text format
+Every request is split into phases (read, parse, validate, auth, store,
+serialize), phase durations are collected in the request context with
+timed() and aggregated into histograms by Registry.observe_request().
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+PHASES = ("read", "parse", "validate", "auth", "store", "serialize", "total")
+BUCKETS = (
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@contextmanager
+def timed(context, phase):
+    """
+    Adds the duration of the block to context["timings"][phase]
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = context.setdefault("timings", {})
+        timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - start
+
+
+class Histogram:
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # the last counter is for the +Inf bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        """
+        :return: lines of cumulative buckets, sum and count
+        """
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            yield f'{name}_bucket{{{labels},le="{le}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class Registry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases = {phase: Histogram() for phase in PHASES}
+        self.responses = {}
+
+    def observe_request(self, context, code):
+        """
+        :param context: request context with "timings" collected by timed()
+        :param code: response code
+        """
+        timings = context.get("timings", {})
+        with self._lock:
+            for phase, seconds in timings.items():
+                self.phases[phase].observe(seconds)
+            self.responses[code] = self.responses.get(code, 0) + 1
+
+    def render(self, store=None):
+        """
+        :param store: cache.Storage to export cache and Redis counters of
+        :return: metrics in Prometheus text exposition format
+        """
+        lines = [
+            "# HELP scoring_request_phase_seconds Time spent in request phases.",
+            "# TYPE scoring_request_phase_seconds histogram",
+        ]
+        with self._lock:
+            for phase, histogram in self.phases.items():
+                lines.extend(
+                    histogram.samples(
+                        "scoring_request_phase_seconds", f'phase="{phase}"'
+                    )
+                )
+            responses = sorted(self.responses.items())
+        lines.append("# HELP scoring_responses_total Responses by code.")
+        lines.append("# TYPE scoring_responses_total counter")
+        lines.extend(
+            f'scoring_responses_total{{code="{code}"}} {count}'
+            for code, count in responses
+        )
+
+        if store is not None:
+            cache_stats = store.cache_stats.as_dict()
+            lookups = cache_stats["hits"] + cache_stats["misses"]
+            for name, value in cache_stats.items():
+                lines.append(f"# TYPE scoring_cache_{name}_total counter")
+                lines.append(f"scoring_cache_{name}_total {value}")
+            lines.append("# HELP scoring_cache_hit_ratio Share of cache hits.")
+            lines.append("# TYPE scoring_cache_hit_ratio gauge")
+            hit_ratio = cache_stats["hits"] / lookups if lookups else 0.0
+            lines.append(f"scoring_cache_hit_ratio {hit_ratio}")
+            for name, value in store.stats.as_dict().items():
+                lines.append(f"# TYPE scoring_redis_{name}_total counter")
+                lines.append(f"scoring_redis_{name}_total {value}")
+            lines.append("# HELP scoring_redis_circuit_open Circuit breaker state.")
+            lines.append("# TYPE scoring_redis_circuit_open gauge")
+            circuit_open = int(store.breaker.state != store.breaker.CLOSED)
+            lines.append(f"scoring_redis_circuit_open {circuit_open}")
+        return "\n".join(lines) + "\n"
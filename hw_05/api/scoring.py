@@ -1,8 +1,12 @@
 import hashlib
-import json
 from datetime import datetime
 from typing import Optional
 
+from interests import decode_interests, interests_location
+
+SCORE_EXPIRES = 60 * 60
+SCORE_STALE_TTL = 5 * 60
+
 
 def get_score(
     store,
@@ -21,27 +25,24 @@ def get_score(
     ]
     key = "uid:" + hashlib.md5("".join(key_parts).encode("utf-8")).hexdigest()
 
-    # Try to get from cache
-    score = store.cache_get(key)
-    if score is not None:
-        return float(score)
-
-    # Calculate score
-    score = 0.0
-    if phone:
-        score += 1.5
-    if email:
-        score += 1.5
-    if birthday and gender is not None:
-        score += 1.5
-    if first_name and last_name:
-        score += 0.5
+    def compute() -> float:
+        score = 0.0
+        if phone:
+            score += 1.5
+        if email:
+            score += 1.5
+        if birthday and gender is not None:
+            score += 1.5
+        if first_name and last_name:
+            score += 0.5
+        return score
 
-    # Cache the score for 60 minutes
-    store.cache_set(key, score, 60 * 60)
-    return score
+    # Cache the score for 60 minutes, serve it stale for 5 more while
+    # a single background refresh recomputes it
+    score = store.cache_get_or_set(key, compute, SCORE_EXPIRES, SCORE_STALE_TTL)
+    return float(score)
 
 
 def get_interests(store, cid: str) -> list:
-    r = store.get(f"i:{cid}")
-    return json.loads(r) if r else ["Empty"]
+    r = store.get_field(*interests_location(cid))
+    return list(decode_interests(r)) if r else ["Empty"]
@@ -0,0 +1,70 @@
+"""
+JSON serializers for the scoring API
+The fastest installed backend is used: orjson, ujson or stdlib json.
+Every serializer decodes str/bytes and encodes to UTF-8 bytes.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover - optional dependency
+    ujson = None
+
+
+class JsonSerializer:
+    name = "json"
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def dumps(self, obj):
+        return json.dumps(obj).encode("utf-8")
+
+
+class UJsonSerializer(JsonSerializer):
+    name = "ujson"
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+    def dumps(self, obj):
+        return ujson.dumps(obj, ensure_ascii=True).encode("utf-8")
+
+
+class OrJsonSerializer(JsonSerializer):
+    name = "orjson"
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+    def dumps(self, obj):
+        # clients_interests responses are keyed by integer client ids
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+
+SERIALIZERS = {"json": JsonSerializer}
+if ujson is not None:
+    SERIALIZERS["ujson"] = UJsonSerializer
+if orjson is not None:
+    SERIALIZERS["orjson"] = OrJsonSerializer
+
+PREFERENCE = ("orjson", "ujson", "json")
+
+
+def get_serializer(name=None):
+    """
+    :param name: backend name, the fastest installed one if omitted
+    :return: serializer instance
+    """
+    if name is None:
+        name = next(n for n in PREFERENCE if n in SERIALIZERS)
+    try:
+        return SERIALIZERS[name]()
+    except KeyError:
+        raise ValueError(f"Serializer {name} is not available")
@@ -4,10 +4,17 @@
 import datetime
 import functools
 import hashlib
+import http.client
+import json
+import socket
+import threading
 import unittest
+import unittest.mock
+from http.server import ThreadingHTTPServer
 
 import api
 import cache
+import serializers
 
 
 def cases(cases):
@@ -255,6 +262,120 @@ class TestSuite(unittest.TestCase):
         except (ConnectionError, TimeoutError) as e:
             print(f"Successfully have got {e} Exception without Redis connection")
 
+    @cases(["01.01.2000", "1.7.2017", "29.02.2024", "31.02.2000", "01.13.2000", "XXX"])
+    def test_date_field_matches_strptime(self, value):
+        try:
+            expected = datetime.datetime.strptime(value, "%d.%m.%Y").date()
+        except ValueError:
+            with self.assertRaisesRegex(ValueError, "DD.MM.YYYY"):
+                api.DateField().clean(value)
+        else:
+            self.assertEqual(expected, api.DateField().clean(value))
+
+    def test_birthday_70_years_boundary(self):
+        today = datetime.date.today()
+        field = api.BirthDayField()
+        field.validator(today - datetime.timedelta(days=25567))
+        with self.assertRaisesRegex(ValueError, "70 years"):
+            field.validator(today - datetime.timedelta(days=25568))
+
+    @cases(sorted(serializers.SERIALIZERS))
+    def test_serializer_roundtrip(self, name):
+        serializer = serializers.get_serializer(name)
+        request = serializer.loads(b'{"method": "online_score", "arguments": {}}')
+        self.assertEqual({"method": "online_score", "arguments": {}}, request)
+        data = serializer.dumps({"response": {1: ["tv"]}, "code": api.OK})
+        self.assertIsInstance(data, bytes)
+        self.assertEqual(
+            {"response": {"1": ["tv"]}, "code": api.OK}, serializer.loads(data)
+        )
+
+
+class TestKeepAlive(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("localhost", 0), api.MainHTTPHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.conn = http.client.HTTPConnection(
+            "localhost", self.server.server_address[1], timeout=5
+        )
+        token = hashlib.sha512(
+            (datetime.datetime.now().strftime("%Y%m%d%H") + api.ADMIN_SALT).encode(
+                "utf-8"
+            )
+        ).hexdigest()
+        self.body = json.dumps(
+            {
+                "account": "horns&hoofs",
+                "login": "admin",
+                "method": "online_score",
+                "token": token,
+                "arguments": {"phone": "79175002040", "email": "stupnikov@otus.ru"},
+            }
+        )
+
+    def tearDown(self):
+        self.conn.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def post(self, body):
+        self.conn.request("POST", "/method/", body)
+        response = self.conn.getresponse()
+        return response, json.loads(response.read())
+
+    def test_requests_share_connection(self):
+        response, data = self.post(self.body)
+        self.assertEqual(11, response.version)
+        self.assertEqual({"response": {"score": 42}, "code": api.OK}, data)
+        sock = self.conn.sock
+        for _ in range(3):
+            response, data = self.post(self.body)
+            self.assertEqual(api.OK, data["code"])
+        self.assertIs(sock, self.conn.sock)
+        self.assertIsNone(response.getheader("Connection"))
+
+    def test_bad_json_keeps_connection(self):
+        _, data = self.post("{")
+        self.assertEqual(api.BAD_REQUEST, data["code"])
+        _, data = self.post(self.body)
+        self.assertEqual(api.OK, data["code"])
+
+    def test_invalid_length_closes_connection(self):
+        for length in ("abc", "-1"):
+            with socket.create_connection(self.server.server_address[:2], timeout=2) as sock:
+                sock.sendall(
+                    f"POST /method/ HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode()
+                )
+                data = b""
+                while chunk := sock.recv(65536):
+                    data += chunk
+            head, _, body = data.partition(b"\r\n\r\n")
+            self.assertEqual(api.BAD_REQUEST, json.loads(body)["code"], length)
+
+    def test_max_requests_closes_connection(self):
+        with unittest.mock.patch.object(api.MainHTTPHandler, "max_requests", 2):
+            response, _ = self.post(self.body)
+            self.assertIsNone(response.getheader("Connection"))
+            response, _ = self.post(self.body)
+            self.assertEqual("close", response.getheader("Connection"))
+            self.assertIsNone(self.conn.sock)
+
+    def test_metrics_endpoint(self):
+        self.post(self.body)
+        self.conn.request("GET", "/metrics")
+        response = self.conn.getresponse()
+        text = response.read().decode("utf-8")
+        self.assertEqual(api.OK, response.status)
+        self.assertTrue(response.getheader("Content-Type").startswith("text/plain"))
+        for phase in ("read", "parse", "validate", "auth", "serialize", "total"):
+            self.assertIn(
+                f'scoring_request_phase_seconds_bucket{{phase="{phase}",le="+Inf"}}',
+                text,
+            )
+        self.assertIn('scoring_responses_total{code="200"}', text)
+        self.assertIn("scoring_cache_hit_ratio", text)
+        self.assertIn("scoring_redis_retries_total", text)
+
 
 if __name__ == "__main__":
     unittest.main()
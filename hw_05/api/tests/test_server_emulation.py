@@ -1,10 +1,24 @@
+import asyncio
+import threading
+import time
+
 import pytest
 from unittest.mock import patch
 import fakeredis
 import redis
 
 
-from cache import RedisStorage, Storage
+import interests
+import loadtest
+from scoring import get_interests
+from cache import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RedisStorage,
+    RetryPolicy,
+    Storage,
+    async_retry,
+)
 
 
 @pytest.fixture
@@ -112,3 +126,185 @@ def test_set_no_exception(redis_storage, storage, mocker):
         pytest.fail("TimeoutError was raised unexpectedly for set")
     except ConnectionError:
         pytest.fail("ConnectionError was raised unexpectedly for set")
+
+
+@pytest.fixture
+def no_sleep(mocker):
+    mocker.patch("cache.time.sleep")
+
+
+def test_cache_get_exhausted_returns_none(redis_storage, storage, mocker, no_sleep):
+    mock_redis = mocker.patch.object(
+        redis_storage.db, "get", side_effect=redis.exceptions.ConnectionError
+    )
+
+    assert storage.cache_get("test_key") is None
+    assert mock_redis.call_count == Storage.MAX_RETRIES
+    assert storage.stats.as_dict() == {"retries": 2, "rejections": 0, "failures": 1}
+
+
+def test_circuit_breaker_fails_fast(redis_storage, mocker, no_sleep):
+    now = [0.0]
+    breaker = CircuitBreaker(
+        failure_threshold=3, recovery_timeout=10, clock=lambda: now[0]
+    )
+    storage = Storage(redis_storage, breaker=breaker)
+    mock_redis = mocker.patch.object(
+        redis_storage.db, "get", side_effect=redis.exceptions.TimeoutError
+    )
+
+    assert storage.cache_get("test_key") is None
+    assert breaker.state == CircuitBreaker.OPEN
+    assert mock_redis.call_count == 3
+
+    # Open circuit: neither cache nor store touches Redis
+    assert storage.cache_get("test_key") is None
+    with pytest.raises(CircuitOpenError):
+        storage.get("test_key")
+    assert mock_redis.call_count == 3
+    assert storage.stats.rejections == 2
+
+    # Half-open trial call closes the circuit again
+    now[0] = 10
+    mock_redis.side_effect = None
+    mock_redis.return_value = "test_value"
+    assert storage.cache_get("test_key") == "test_value"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_unexpected_error_ends_half_open_trial(redis_storage, mocker, no_sleep):
+    now = [0.0]
+    breaker = CircuitBreaker(
+        failure_threshold=1, recovery_timeout=10, clock=lambda: now[0]
+    )
+    storage = Storage(redis_storage, breaker=breaker)
+    mock_redis = mocker.patch.object(
+        redis_storage.db, "hget", side_effect=redis.exceptions.TimeoutError
+    )
+    with pytest.raises(TimeoutError):
+        storage.get_field("i:1", "interests")
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # The trial call reaches Redis but fails with a command error
+    now[0] = 10
+    mock_redis.side_effect = redis.exceptions.ResponseError("WRONGTYPE")
+    with pytest.raises(redis.exceptions.ResponseError):
+        storage.get_field("i:1", "interests")
+    mock_redis.side_effect = None
+    mock_redis.return_value = "test_value"
+    assert storage.get_field("i:1", "interests") == "test_value"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    # The same for calls made through the retry policy
+    breaker.record_failure()
+    now[0] = 20
+    policy = RetryPolicy(TimeoutError, breaker=breaker)
+    with pytest.raises(ValueError):
+        policy.call(mocker.Mock(side_effect=ValueError))
+    assert policy.call(lambda: "ok") == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_retry_policy_jitter_is_bounded():
+    policy = RetryPolicy(TimeoutError, backoff_factor=0.3, max_delay=1.0)
+    for attempt in range(10):
+        assert 0 <= policy.delay(attempt) <= min(1.0, 0.3 * 2**attempt)
+
+
+def test_async_retry(mocker):
+    mocker.patch("cache.asyncio.sleep", mocker.AsyncMock())
+    calls = []
+
+    @async_retry((TimeoutError,), attempts=3)
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise TimeoutError
+        return "test_value"
+
+    assert asyncio.run(flaky()) == "test_value"
+    assert len(calls) == 3
+    assert flaky.policy.stats.retries == 2
+
+
+def test_cache_get_or_set_coalesces_concurrent_misses(storage):
+    calls = []
+    barrier = threading.Barrier(8)
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return 1.5
+
+    def worker(results):
+        barrier.wait()
+        results.append(storage.cache_get_or_set("uid:hot", compute, 60))
+
+    results = []
+    threads = [threading.Thread(target=worker, args=(results,)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert len(results) == 8
+    assert {float(r) for r in results} == {1.5}
+
+
+def test_cache_get_or_set_serves_stale_and_refreshes(redis_storage, storage):
+    storage.cache_set("uid:stale", "1.0", 30)
+    refreshed = threading.Event()
+
+    def compute():
+        refreshed.set()
+        return 3.0
+
+    # 30 seconds left is inside the 60 seconds stale window
+    assert storage.cache_get_or_set("uid:stale", compute, 3600, 60) == "1.0"
+    assert refreshed.wait(5)
+    storage._executor.shutdown(wait=True)
+
+    value, ttl = redis_storage.get_with_ttl("uid:stale")
+    assert float(value) == 3.0
+    assert ttl > 3600
+
+
+def test_loadtest_reports_latency_percentiles():
+    workload = loadtest.Workload(users=20, clients=50, seed=1)
+    store = Storage(loadtest.FakeRedisStorage(seed=1))
+    workload.seed_store(store)
+
+    report = loadtest.run(store, workload, requests=200, concurrency=4)
+
+    assert report["requests"] == 200
+    assert report["rps"] > 0
+    assert report["p50"] <= report["p95"] <= report["p99"] <= report["max"]
+    assert {code for _, code in report["codes"]} == {200}
+
+
+def test_fake_redis_injected_failures():
+    fake_redis = loadtest.FakeRedisStorage(failure_rate=1.0, seed=1)
+
+    with pytest.raises((ConnectionError, TimeoutError)):
+        fake_redis.get("i:1")
+
+
+def test_interests_bitmask_roundtrip():
+    mask = interests.encode_interests(["tv", "cars", "otus"])
+
+    assert interests.decode_interests(mask) == ("cars", "tv", "otus")
+    assert interests.decode_interests(str(mask)) == ("cars", "tv", "otus")
+    with pytest.raises(ValueError):
+        interests.encode_interests(["unknown"])
+
+
+def test_load_and_get_interests(redis_storage, storage):
+    items = [(cid, ["books", "sport"] if cid % 2 else ["geek"]) for cid in range(250)]
+
+    assert interests.load_interests(storage, items, chunk_size=100) == 250
+
+    assert redis_storage.db.hlen("ib:0") == interests.BUCKET_SIZE
+    assert get_interests(storage, 201) == ["sport", "books"]
+    assert get_interests(storage, 42) == ["geek"]
+    assert get_interests(storage, 100500) == ["Empty"]
@@ -0,0 +1,71 @@
+# Rows/sec of the per-object repository path against add_many
+# Usage (from hw_06/api): python -m benchmarks.bulk_insert -n 100000
+import os
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from domain.models import Product
+from infrastructure.orm import Base
+from infrastructure.repositories import SqlAlchemyProductRepository
+from infrastructure.unit_of_work import SqlAlchemyUnitOfWork
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+def make_products(n):
+    return [Product(id=None, name=f"product{i}", quantity=i % 100, price=i * 0.5) for i in range(n)]
+
+
+def per_object_commit_each(session, products):
+    repo = SqlAlchemyProductRepository(session)
+    for product in products:
+        repo.add(product)
+        session.commit()
+
+
+def per_object(session, products):
+    repo = SqlAlchemyProductRepository(session)
+    with SqlAlchemyUnitOfWork(session):
+        for product in products:
+            repo.add(product)
+
+
+def bulk(session, products):
+    repo = SqlAlchemyProductRepository(session)
+    with SqlAlchemyUnitOfWork(session):
+        repo.add_many(products)
+
+
+def run(n):
+    """
+    :return: {path name: rows/sec}
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, func, rows in (
+            # commit per row means fsync per row, so it is measured on fewer rows
+            ("per-object, commit each", per_object_commit_each, min(n, 1000)),
+            ("per-object, one commit", per_object, n),
+            ("add_many", bulk, n),
+        ):
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, name + '.db')}")
+            Base.metadata.create_all(engine)
+            session = sessionmaker(bind=engine)()
+            products = make_products(rows)
+            start = time.perf_counter()
+            func(session, products)
+            results[name] = rows / (time.perf_counter() - start)
+            session.close()
+            engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("-n", "--rows", type=int, default=100000)
+    args = parser.parse_args()
+    results = run(args.rows)
+    base = results["per-object, one commit"]
+    for name, rate in results.items():
+        print(f"{name:<25} {rate:>12,.0f} rows/sec {rate / base:>6.1f}x")
@@ -0,0 +1,188 @@
+# Throughput and statement counts of the warehouse service on a seeded temp SQLite database
+# Usage (from hw_06/api): python -m benchmarks.warehouse -n 10000
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+from domain.services import WarehouseService
+from infrastructure.database import Database, DatabaseConfig
+from infrastructure.query_stats import QueryStats
+from infrastructure.repositories import ORDER_PRODUCTS_CHUNK
+from infrastructure.unit_of_work import SqlAlchemyUnitOfWork
+
+# Products per seeded order
+ORDER_SIZE = 3
+
+
+# Statements allowed per call as a function of the rows a call returns. Every scenario
+# runs against N seeded rows, so a repository method that issues a query per row
+# (N+1) goes over its budget right away
+QUERY_BUDGETS: Dict[str, Callable[[int], int]] = {
+    "create_product": lambda rows: 1,
+    # ORDER_SIZE product gets, one IN query for the products, the order and its links
+    "create_order": lambda rows: ORDER_SIZE + 3,
+    "uow commit": lambda rows: 1,
+    "product_repo.get": lambda rows: 1,
+    "customer_repo.get": lambda rows: 1,
+    "order_repo.get": lambda rows: 2,
+    "product_repo.list": lambda rows: 1,
+    "customer_repo.list": lambda rows: 1,
+    "order_repo.list": lambda rows: 1 + max(1, math.ceil(rows / ORDER_PRODUCTS_CHUNK)),
+}
+
+
+@dataclass
+class Result:
+    name: str
+    calls: int
+    rows: int
+    seconds: float
+    statements: int
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    @property
+    def statements_per_call(self) -> float:
+        return self.statements / self.calls if self.calls else 0.0
+
+    @property
+    def budget(self) -> int:
+        return QUERY_BUDGETS[self.name](self.rows // max(self.calls, 1))
+
+
+def seed(database: Database, n: int):
+    """N products, N customers and N orders of ORDER_SIZE products each"""
+    with SqlAlchemyUnitOfWork(database.session()) as uow:
+        service = WarehouseService(uow.product_repo, uow.order_repo, uow.customer_repo)
+        service.create_products(
+            {"name": f"product{i}", "quantity": 1000, "price": i * 0.5} for i in range(n)
+        )
+        service.create_customers(
+            {"name": f"customer{i}", "email": f"customer{i}@example.com"} for i in range(n)
+        )
+        products = uow.product_repo.list()
+        service.create_orders(
+            [products[(i + j) % n] for j in range(min(ORDER_SIZE, n))] for i in range(n)
+        )
+
+
+def create_product(uow, service, n, rng):
+    for i in range(n):
+        with uow:
+            service.create_product(name=f"new{i}", quantity=1, price=1.0)
+    return n, n
+
+
+def create_order(uow, service, n, rng):
+    for _ in range(n):
+        with uow:
+            product_ids = rng.sample(range(1, n + 1), min(ORDER_SIZE, n))
+            products = [uow.product_repo.get(pid) for pid in product_ids]
+            service.create_order(products)
+    return n, n
+
+
+def uow_commit(uow, service, n, rng):
+    for i in range(n):
+        with uow:
+            service.create_customer(name=f"new{i}", email=f"new{i}@example.com")
+    return n, n
+
+
+def getter(repo_name):
+    def get(uow, service, n, rng):
+        repo = getattr(uow, repo_name)
+        with uow:
+            for object_id in rng.sample(range(1, n + 1), n):
+                repo.get(object_id)
+        return n, n
+
+    return get
+
+
+def lister(repo_name, calls=3):
+    def list_all(uow, service, n, rng):
+        repo = getattr(uow, repo_name)
+        rows = 0
+        for _ in range(calls):
+            with uow:
+                rows += len(repo.list())
+        return calls, rows
+
+    return list_all
+
+
+# name -> callable(uow, service, n, rng) -> (calls, rows)
+SCENARIOS: Dict[str, Callable] = {
+    "product_repo.get": getter("product_repo"),
+    "customer_repo.get": getter("customer_repo"),
+    "order_repo.get": getter("order_repo"),
+    "product_repo.list": lister("product_repo"),
+    "customer_repo.list": lister("customer_repo"),
+    "order_repo.list": lister("order_repo"),
+    # the writes go last, so the reads see exactly N rows
+    "create_product": create_product,
+    "create_order": create_order,
+    "uow commit": uow_commit,
+}
+
+
+def run(n: int, seed_value: int = 0) -> List[Result]:
+    rng = random.Random(seed_value)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(DatabaseConfig(url=f"sqlite:///{os.path.join(tmp, 'warehouse.db')}"))
+        try:
+            seed(database, n)
+            for name, scenario in SCENARIOS.items():
+                session = database.session()
+                uow = SqlAlchemyUnitOfWork(session)
+                service = WarehouseService(uow.product_repo, uow.order_repo, uow.customer_repo)
+                # statements of the scenario's session, an executemany() counts as one
+                query_stats = QueryStats(session)
+                query_stats.start()
+                start = time.perf_counter()
+                try:
+                    calls, rows = scenario(uow, service, n, rng)
+                finally:
+                    summary = query_stats.stop()
+                seconds = time.perf_counter() - start
+                results.append(Result(name, calls, rows, seconds, summary.statements))
+                session.close()
+        finally:
+            database.dispose()
+    return results
+
+
+def over_budget(results: List[Result]) -> List[Result]:
+    return [r for r in results if r.statements_per_call > r.budget]
+
+
+def print_report(results: List[Result]):
+    print(f"{'scenario':<20} {'rows/sec':>12} {'queries/call':>13} {'budget':>7}")
+    for r in results:
+        print(
+            f"{r.name:<20} {r.rows_per_sec:>12,.0f} {r.statements_per_call:>13.2f}"
+            f" {r.budget:>7}"
+        )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("-n", "--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    report = run(args.rows, args.seed)
+    print_report(report)
+    failed = over_budget(report)
+    if failed:
+        print("over query budget: " + ", ".join(r.name for r in failed))
+        sys.exit(1)
@@ -0,0 +1,9 @@
+from typing import Iterable
+
+
+class InsufficientStockError(Exception):
+    """Raised when a reservation asks for more than is in stock, nothing is reserved"""
+
+    def __init__(self, product_ids: Iterable[int]):
+        self.product_ids = sorted(product_ids)
+        super().__init__(f"Insufficient stock for products: {self.product_ids}")
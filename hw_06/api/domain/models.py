@@ -2,7 +2,7 @@ from dataclasses import dataclass, field
 from typing import List
 
 
-@dataclass
+@dataclass(slots=True)
 class Product:
     id: int
     name: str
@@ -10,7 +10,7 @@ class Product:
     price: float
 
 
-@dataclass
+@dataclass(slots=True)
 class Order:
     id: int
     products: List[Product] = field(default_factory=list)
@@ -18,9 +18,13 @@ class Order:
     def add_product(self, product: Product):
         self.products.append(product)
 
+    @property
+    def total(self) -> float:
+        return sum(p.price for p in self.products)
+
 
 # Added Customer class
-@dataclass
+@dataclass(slots=True)
 class Customer:
     id: int
     name: str
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import AsyncIterator, Iterable, Iterator, List, Mapping
 
 from .models import Product, Order, Customer
 
@@ -9,6 +9,10 @@ class ProductRepository(ABC):
     def add(self, product: Product):
         pass
 
+    @abstractmethod
+    def add_many(self, products: Iterable[Product]):
+        pass
+
     @abstractmethod
     def get(self, product_id: int) -> Product:
         pass
@@ -17,12 +21,27 @@ class ProductRepository(ABC):
     def list(self) -> List[Product]:
         pass
 
+    @abstractmethod
+    def iter_products(self, batch_size: int) -> Iterator[Product]:
+        pass
+
+    @abstractmethod
+    def decrement_stock(self, quantities: Mapping[int, int]):
+        """
+        Takes quantities[product_id] items of every product off the stock, either all
+        of them or none; raises InsufficientStockError
+        """
+
 
 class OrderRepository(ABC):
     @abstractmethod
     def add(self, order: Order):
         pass
 
+    @abstractmethod
+    def add_many(self, orders: Iterable[Order]):
+        pass
+
     @abstractmethod
     def get(self, order_id: int) -> Order:
         pass
@@ -31,6 +50,18 @@ class OrderRepository(ABC):
     def list(self) -> List[Order]:
         pass
 
+    @abstractmethod
+    def iter_orders(self, batch_size: int) -> Iterator[Order]:
+        pass
+
+    @abstractmethod
+    def get_total(self, order_id: int) -> float:
+        pass
+
+    @abstractmethod
+    def list_ids_by_product(self, product_id: int) -> List[int]:
+        pass
+
 
 # Added Customer Repository
 class CustomerRepository(ABC):
@@ -38,6 +69,10 @@ class CustomerRepository(ABC):
     def add(self, customer: Customer):
         pass
 
+    @abstractmethod
+    def add_many(self, customers: Iterable[Customer]):
+        pass
+
     @abstractmethod
     def get(self, customer_id: int) -> Customer:
         pass
@@ -45,3 +80,86 @@ class CustomerRepository(ABC):
     @abstractmethod
     def list(self) -> List[Customer]:
         pass
+
+    @abstractmethod
+    def iter_customers(self, batch_size: int) -> Iterator[Customer]:
+        pass
+
+
+# Async counterparts for asyncio web stacks
+class AsyncProductRepository(ABC):
+    @abstractmethod
+    def add(self, product: Product):
+        pass
+
+    @abstractmethod
+    async def add_many(self, products: Iterable[Product]):
+        pass
+
+    @abstractmethod
+    async def get(self, product_id: int) -> Product:
+        pass
+
+    @abstractmethod
+    async def list(self) -> List[Product]:
+        pass
+
+    @abstractmethod
+    def iter_products(self, batch_size: int) -> AsyncIterator[Product]:
+        pass
+
+    @abstractmethod
+    async def decrement_stock(self, quantities: Mapping[int, int]):
+        pass
+
+
+class AsyncOrderRepository(ABC):
+    @abstractmethod
+    async def add(self, order: Order):
+        pass
+
+    @abstractmethod
+    async def add_many(self, orders: Iterable[Order]):
+        pass
+
+    @abstractmethod
+    async def get(self, order_id: int) -> Order:
+        pass
+
+    @abstractmethod
+    async def list(self) -> List[Order]:
+        pass
+
+    @abstractmethod
+    def iter_orders(self, batch_size: int) -> AsyncIterator[Order]:
+        pass
+
+    @abstractmethod
+    async def get_total(self, order_id: int) -> float:
+        pass
+
+    @abstractmethod
+    async def list_ids_by_product(self, product_id: int) -> List[int]:
+        pass
+
+
+class AsyncCustomerRepository(ABC):
+    @abstractmethod
+    def add(self, customer: Customer):
+        pass
+
+    @abstractmethod
+    async def add_many(self, customers: Iterable[Customer]):
+        pass
+
+    @abstractmethod
+    async def get(self, customer_id: int) -> Customer:
+        pass
+
+    @abstractmethod
+    async def list(self) -> List[Customer]:
+        pass
+
+    @abstractmethod
+    def iter_customers(self, batch_size: int) -> AsyncIterator[Customer]:
+        pass
@@ -1,7 +1,25 @@
-from typing import List
+from collections import Counter
+from typing import Dict, Iterable, List, Mapping
 
 from .models import Product, Order, Customer
-from .repositories import ProductRepository, OrderRepository, CustomerRepository
+from .repositories import (
+    AsyncCustomerRepository,
+    AsyncOrderRepository,
+    AsyncProductRepository,
+    CustomerRepository,
+    OrderRepository,
+    ProductRepository,
+)
+
+
+def _reserved_quantities(product_lists: Iterable[List[Product]]) -> Dict[int, int]:
+    """One item per occurrence of a product, summed over all the orders"""
+    return Counter(p.id for products in product_lists for p in products)
+
+
+def _check_quantities(quantities: Mapping[int, int]):
+    if any(quantity <= 0 for quantity in quantities.values()):
+        raise ValueError("Reserved quantities must be positive")
 
 
 class WarehouseService:
@@ -20,8 +38,100 @@ class WarehouseService:
         self.order_repo.add(order)
         return order
 
+    def create_products(self, items: Iterable[dict]) -> List[Product]:
+        """Batch creation, items are dicts with name, quantity and price"""
+        products = [Product(id=None, **item) for item in items]
+        self.product_repo.add_many(products)
+        return products
+
+    def create_orders(self, product_lists: Iterable[List[Product]]) -> List[Order]:
+        """Batch creation, one order per list of products"""
+        orders = [Order(id=None, products=products) for products in product_lists]
+        self.order_repo.add_many(orders)
+        return orders
+
+    def reserve_stock(self, quantities: Mapping[int, int]):
+        """
+        Takes quantities[product_id] items off the stock with one conditional UPDATE
+        per batch, all or nothing; raises InsufficientStockError
+        """
+        _check_quantities(quantities)
+        self.product_repo.decrement_stock(quantities)
+
+    def place_order(self, products: List[Product]) -> Order:
+        """Reserves the products and creates the order in the same unit of work"""
+        self.product_repo.decrement_stock(_reserved_quantities([products]))
+        return self.create_order(products)
+
+    def place_orders(self, product_lists: Iterable[List[Product]]) -> List[Order]:
+        """Batch placement: a single reservation for all the orders, then add_many"""
+        product_lists = list(product_lists)
+        self.product_repo.decrement_stock(_reserved_quantities(product_lists))
+        return self.create_orders(product_lists)
+
     # Added create_customer
     def create_customer(self, name: str, email: str) -> Customer:
         customer = Customer(id=None, name=name, email=email)
         self.customer_repo.add(customer)
         return customer
+
+    def create_customers(self, items: Iterable[dict]) -> List[Customer]:
+        """Batch creation, items are dicts with name and email"""
+        customers = [Customer(id=None, **item) for item in items]
+        self.customer_repo.add_many(customers)
+        return customers
+
+
+class AsyncWarehouseService:
+    def __init__(
+        self,
+        product_repo: AsyncProductRepository,
+        order_repo: AsyncOrderRepository,
+        customer_repo: AsyncCustomerRepository,
+    ):
+        self.product_repo = product_repo
+        self.order_repo = order_repo
+        self.customer_repo = customer_repo
+
+    async def create_product(self, name: str, quantity: int, price: float) -> Product:
+        product = Product(id=None, name=name, quantity=quantity, price=price)
+        self.product_repo.add(product)
+        return product
+
+    async def create_order(self, products: List[Product]) -> Order:
+        order = Order(id=None, products=products)
+        await self.order_repo.add(order)
+        return order
+
+    async def reserve_stock(self, quantities: Mapping[int, int]):
+        _check_quantities(quantities)
+        await self.product_repo.decrement_stock(quantities)
+
+    async def place_order(self, products: List[Product]) -> Order:
+        await self.product_repo.decrement_stock(_reserved_quantities([products]))
+        return await self.create_order(products)
+
+    async def place_orders(self, product_lists: Iterable[List[Product]]) -> List[Order]:
+        product_lists = list(product_lists)
+        await self.product_repo.decrement_stock(_reserved_quantities(product_lists))
+        return await self.create_orders(product_lists)
+
+    async def create_customer(self, name: str, email: str) -> Customer:
+        customer = Customer(id=None, name=name, email=email)
+        self.customer_repo.add(customer)
+        return customer
+
+    async def create_products(self, items: Iterable[dict]) -> List[Product]:
+        products = [Product(id=None, **item) for item in items]
+        await self.product_repo.add_many(products)
+        return products
+
+    async def create_orders(self, product_lists: Iterable[List[Product]]) -> List[Order]:
+        orders = [Order(id=None, products=products) for products in product_lists]
+        await self.order_repo.add_many(orders)
+        return orders
+
+    async def create_customers(self, items: Iterable[dict]) -> List[Customer]:
+        customers = [Customer(id=None, **item) for item in items]
+        await self.customer_repo.add_many(customers)
+        return customers
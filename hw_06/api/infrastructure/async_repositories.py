@@ -0,0 +1,232 @@
+# asyncio implementations of the repositories on SQLAlchemy's AsyncSession,
+# the statements are shared with the synchronous ones
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List, Mapping, Optional, TypeVar
+
+from domain.exceptions import InsufficientStockError
+from domain.models import Order, Product, Customer
+from domain.repositories import (
+    AsyncProductRepository,
+    AsyncOrderRepository,
+    AsyncCustomerRepository,
+)
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .identity_map import IdentityMap
+from .orm import CustomerORM, OrderORM, ProductORM
+from .repositories import (
+    BATCH_SIZE,
+    CUSTOMER_COLUMNS,
+    ORDER_PRODUCTS_CHUNK,
+    PRODUCT_COLUMNS,
+    _check_products_found,
+    _chunks,
+    _decrement_stock_query,
+    _existing_products_query,
+    _forget_products,
+    _group_order_products,
+    _in_stock_query,
+    _insert_returning_ids,
+    _order_products_query,
+    _page_query,
+    _refresh_totals,
+)
+
+T = TypeVar("T")
+
+
+async def _get(
+    identity_map: Optional[IdentityMap],
+    model: type,
+    object_id: int,
+    load: Callable[[], Awaitable[T]],
+) -> T:
+    if identity_map is None:
+        return await load()
+    obj = identity_map.get(model, object_id)
+    if obj is None:
+        obj = await load()
+        identity_map.add(model, object_id, obj)
+    return obj
+
+
+async def _iter_pages(
+    session: AsyncSession, columns: tuple, batch_size: int
+) -> AsyncIterator[list]:
+    """
+    Keyset pagination over plain column rows, one list of at most batch_size rows per page;
+    _page_query asks for a server-side cursor, which AsyncSession only serves through stream()
+    """
+    last_id = None
+    while True:
+        result = await session.stream(_page_query(columns, last_id, batch_size))
+        rows = await result.all()
+        if rows:
+            yield rows
+            last_id = rows[-1][0]
+        if len(rows) < batch_size:
+            return
+
+
+class AsyncSqlAlchemyProductRepository(AsyncProductRepository):
+    def __init__(self, session: AsyncSession, identity_map: Optional[IdentityMap] = None):
+        self.session = session
+        self.identity_map = identity_map
+
+    def add(self, product: Product):
+        self.session.add(
+            ProductORM(name=product.name, quantity=product.quantity, price=product.price)
+        )
+
+    async def add_many(self, products: Iterable[Product]):
+        for chunk in _chunks(products, BATCH_SIZE):
+            product_ids = await self.session.scalars(
+                _insert_returning_ids(ProductORM),
+                [{"name": p.name, "quantity": p.quantity, "price": p.price} for p in chunk],
+            )
+            for product, product_id in zip(chunk, product_ids.all()):
+                product.id = product_id
+
+    async def get(self, product_id: int) -> Product:
+        return await _get(self.identity_map, Product, product_id, lambda: self._load(product_id))
+
+    async def _load(self, product_id: int) -> Product:
+        row = (
+            await self.session.execute(select(*PRODUCT_COLUMNS).where(ProductORM.id == product_id))
+        ).one()
+        return Product(*row)
+
+    async def list(self) -> List[Product]:
+        rows = await self.session.execute(select(*PRODUCT_COLUMNS).order_by(ProductORM.id))
+        return [Product(*row) for row in rows]
+
+    async def iter_products(self, batch_size: int = BATCH_SIZE) -> AsyncIterator[Product]:
+        async for page in _iter_pages(self.session, PRODUCT_COLUMNS, batch_size):
+            for row in page:
+                yield Product(*row)
+
+    async def decrement_stock(self, quantities: Mapping[int, int]):
+        for chunk in _chunks(quantities.items(), BATCH_SIZE):
+            chunk = dict(chunk)
+            _forget_products(self.session.sync_session, self.identity_map, chunk)
+            result = await self.session.execute(_decrement_stock_query(chunk))
+            if result.rowcount != len(chunk):
+                in_stock = (await self.session.scalars(_in_stock_query(chunk))).all()
+                raise InsufficientStockError(chunk.keys() - set(in_stock))
+
+
+class AsyncSqlAlchemyOrderRepository(AsyncOrderRepository):
+    def __init__(self, session: AsyncSession, identity_map: Optional[IdentityMap] = None):
+        self.session = session
+        self.identity_map = identity_map
+
+    async def add(self, order: Order):
+        product_ids = {p.id for p in order.products}
+        products_orm = {
+            p.id: p
+            for p in await self.session.scalars(
+                select(ProductORM).where(ProductORM.id.in_(product_ids))
+            )
+        }
+        _check_products_found(product_ids, products_orm)
+        order_orm = OrderORM()
+        order_orm.products = [products_orm[p.id] for p in order.products]
+        order_orm.total = sum(p.price for p in order_orm.products)
+        self.session.add(order_orm)
+
+    async def add_many(self, orders: Iterable[Order]):
+        for chunk in _chunks(orders, BATCH_SIZE):
+            product_ids = {p.id for order in chunk for p in order.products}
+            if product_ids:
+                found_ids = await self.session.scalars(_existing_products_query(product_ids))
+                _check_products_found(product_ids, found_ids)
+            order_ids = (
+                await self.session.scalars(
+                    insert(OrderORM).returning(OrderORM.id), [{} for _ in chunk]
+                )
+            ).all()
+            links = []
+            for order, order_id in zip(chunk, order_ids):
+                order.id = order_id
+                links.extend({"order_id": order_id, "product_id": p.id} for p in order.products)
+            if links:
+                await self.session.execute(insert(OrderORM.order_product_assocoations), links)
+                await self.session.execute(_refresh_totals(order_ids))
+
+    async def get(self, order_id: int) -> Order:
+        return await _get(self.identity_map, Order, order_id, lambda: self._load(order_id))
+
+    async def _load(self, order_id: int) -> Order:
+        (await self.session.scalars(select(OrderORM.id).where(OrderORM.id == order_id))).one()
+        return (await self._with_products([order_id]))[0]
+
+    async def list(self) -> List[Order]:
+        order_ids = (await self.session.scalars(select(OrderORM.id).order_by(OrderORM.id))).all()
+        return await self._with_products(order_ids)
+
+    async def _with_products(self, order_ids: List[int]) -> List[Order]:
+        orders = []
+        for chunk in _chunks(order_ids, ORDER_PRODUCTS_CHUNK):
+            rows = await self.session.execute(_order_products_query(chunk))
+            orders.extend(_group_order_products(chunk, rows))
+        return orders
+
+    async def iter_orders(self, batch_size: int = BATCH_SIZE) -> AsyncIterator[Order]:
+        async for page in _iter_pages(self.session, (OrderORM.id,), batch_size):
+            order_ids = [row[0] for row in page]
+            rows = await self.session.execute(_order_products_query(order_ids))
+            for order in _group_order_products(order_ids, rows):
+                yield order
+
+    async def get_total(self, order_id: int) -> float:
+        return (
+            await self.session.scalars(select(OrderORM.total).where(OrderORM.id == order_id))
+        ).one()
+
+    async def list_ids_by_product(self, product_id: int) -> List[int]:
+        links = OrderORM.order_product_assocoations
+        order_ids = await self.session.scalars(
+            select(links.c.order_id)
+            .where(links.c.product_id == product_id)
+            .distinct()
+            .order_by(links.c.order_id)
+        )
+        return order_ids.all()
+
+
+class AsyncSqlAlchemyCustomerRepository(AsyncCustomerRepository):
+    def __init__(self, session: AsyncSession, identity_map: Optional[IdentityMap] = None):
+        self.session = session
+        self.identity_map = identity_map
+
+    def add(self, customer: Customer):
+        self.session.add(CustomerORM(name=customer.name, email=customer.email))
+
+    async def add_many(self, customers: Iterable[Customer]):
+        for chunk in _chunks(customers, BATCH_SIZE):
+            customer_ids = await self.session.scalars(
+                _insert_returning_ids(CustomerORM),
+                [{"name": c.name, "email": c.email} for c in chunk],
+            )
+            for customer, customer_id in zip(chunk, customer_ids.all()):
+                customer.id = customer_id
+
+    async def get(self, customer_id: int) -> Customer:
+        return await _get(self.identity_map, Customer, customer_id, lambda: self._load(customer_id))
+
+    async def _load(self, customer_id: int) -> Customer:
+        row = (
+            await self.session.execute(
+                select(*CUSTOMER_COLUMNS).where(CustomerORM.id == customer_id)
+            )
+        ).one()
+        return Customer(*row)
+
+    async def list(self) -> List[Customer]:
+        rows = await self.session.execute(select(*CUSTOMER_COLUMNS).order_by(CustomerORM.id))
+        return [Customer(*row) for row in rows]
+
+    async def iter_customers(self, batch_size: int = BATCH_SIZE) -> AsyncIterator[Customer]:
+        async for page in _iter_pages(self.session, CUSTOMER_COLUMNS, batch_size):
+            for row in page:
+                yield Customer(*row)
@@ -0,0 +1,53 @@
+import logging
+from typing import Optional
+
+from domain.unit_of_work import AsyncUnitOfWork
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .async_repositories import (
+    AsyncSqlAlchemyCustomerRepository,
+    AsyncSqlAlchemyOrderRepository,
+    AsyncSqlAlchemyProductRepository,
+)
+from .identity_map import IdentityMap
+from .query_stats import SLOW_QUERY_THRESHOLD, QueryStats, QuerySummary
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSqlAlchemyUnitOfWork(AsyncUnitOfWork):
+
+    def __init__(self, session: AsyncSession, slow_query_threshold: float = SLOW_QUERY_THRESHOLD):
+        self.session = session
+        self.query_stats = QueryStats(session.sync_session, slow_query_threshold)
+        self.summary: Optional[QuerySummary] = None
+        self.identity_map = IdentityMap()
+        self.product_repo = AsyncSqlAlchemyProductRepository(session, self.identity_map)
+        self.order_repo = AsyncSqlAlchemyOrderRepository(session, self.identity_map)
+        self.customer_repo = AsyncSqlAlchemyCustomerRepository(session, self.identity_map)
+
+    async def __aenter__(self):
+        self.query_stats.start()
+        return self
+
+    async def __aexit__(self, exception_type, exception_value, traceback):
+        try:
+            if exception_type is None:
+                try:
+                    await self.commit()
+                except BaseException:
+                    await self.rollback()
+                    raise
+            else:
+                await self.rollback()
+        finally:
+            self.summary = self.query_stats.stop()
+            logger.debug("Unit of work: %s", self.summary.as_dict())
+
+    async def commit(self):
+        await self.session.commit()
+        self.identity_map.clear()
+
+    async def rollback(self):
+        await self.session.rollback()
+        self.identity_map.clear()
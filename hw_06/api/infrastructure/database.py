@@ -1 +1,196 @@
-DATABASE_URL= 'sqlite:///warehouse.db'
+import asyncio
+import os
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import Session, sessionmaker
+
+from .migrations import upgrade, upgrade_connection
+from .orm import Base
+
+# Default URL, overridden with WAREHOUSE_DB_URL through DatabaseConfig.from_env()
+DATABASE_URL = 'sqlite:///warehouse.db'
+
+
+@dataclass
+class DatabaseConfig:
+    url: str = DATABASE_URL
+    # Connection pool, not used for in-memory SQLite
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30.0
+    pool_recycle: int = 3600
+    pool_pre_ping: bool = False
+    # SQLite profile for local deployments: WAL lets readers work alongside
+    # the writer, busy_timeout makes writers wait for the lock instead of failing
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_cache_size: int = -64000  # negative means KiB, i.e. 64 MiB per connection
+    sqlite_busy_timeout: int = 5000  # ms
+    echo: bool = False
+
+    @classmethod
+    def from_env(cls, prefix: str = "WAREHOUSE_DB_") -> "DatabaseConfig":
+        """Overrides defaults with WAREHOUSE_DB_<FIELD> environment variables"""
+        config = cls()
+        for name, default in vars(cls()).items():
+            value = os.environ.get(prefix + name.upper())
+            if value is None:
+                continue
+            if isinstance(default, bool):
+                value = value.lower() in ("1", "true", "yes", "on")
+            setattr(config, name, type(default)(value))
+        return config
+
+    @property
+    def is_sqlite(self) -> bool:
+        return make_url(self.url).get_backend_name() == "sqlite"
+
+    @property
+    def is_memory(self) -> bool:
+        return self.is_sqlite and make_url(self.url).database in (None, "", ":memory:")
+
+
+def _engine_kwargs(config: DatabaseConfig) -> dict:
+    kwargs = {"echo": config.echo}
+    if not config.is_memory:
+        kwargs.update(
+            pool_size=config.pool_size,
+            max_overflow=config.max_overflow,
+            pool_timeout=config.pool_timeout,
+            pool_recycle=config.pool_recycle,
+            pool_pre_ping=config.pool_pre_ping,
+        )
+    if config.is_sqlite:
+        kwargs["connect_args"] = {
+            "timeout": config.sqlite_busy_timeout / 1000,
+            "check_same_thread": False,
+        }
+    return kwargs
+
+
+def _set_sqlite_pragmas(engine: Engine, config: DatabaseConfig):
+    pragmas = [
+        f"PRAGMA synchronous={config.sqlite_synchronous}",
+        f"PRAGMA cache_size={config.sqlite_cache_size}",
+        f"PRAGMA busy_timeout={config.sqlite_busy_timeout}",
+    ]
+    if not config.is_memory:
+        pragmas.insert(0, f"PRAGMA journal_mode={config.sqlite_journal_mode}")
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def create_engine_from_config(config: DatabaseConfig) -> Engine:
+    engine = create_engine(config.url, **_engine_kwargs(config))
+    if config.is_sqlite:
+        _set_sqlite_pragmas(engine, config)
+    return engine
+
+
+def async_url(url: str) -> str:
+    """sqlite:///warehouse.db -> sqlite+aiosqlite:///warehouse.db"""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.get_driver_name() != "aiosqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url.render_as_string(hide_password=False)
+
+
+def create_async_engine_from_config(config: DatabaseConfig) -> AsyncEngine:
+    engine = create_async_engine(async_url(config.url), **_engine_kwargs(config))
+    if config.is_sqlite:
+        _set_sqlite_pragmas(engine.sync_engine, config)
+    return engine
+
+
+class Database:
+    """
+    Engine and session factory created on first use,
+    the schema is created once before the first session is handed out
+    """
+
+    def __init__(self, config: Optional[DatabaseConfig] = None):
+        self.config = config or DatabaseConfig.from_env()
+        self._engine: Optional[Engine] = None
+        self._session_factory: Optional[sessionmaker] = None
+        self._schema_ready = False
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self) -> Engine:
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = create_engine_from_config(self.config)
+                    self._session_factory = sessionmaker(bind=self._engine)
+        return self._engine
+
+    def create_schema(self):
+        engine = self.engine
+        with self._lock:
+            if not self._schema_ready:
+                Base.metadata.create_all(engine)
+                upgrade(engine)
+                self._schema_ready = True
+
+    def session(self) -> Session:
+        if not self._schema_ready:
+            self.create_schema()
+        return self._session_factory()
+
+    def dispose(self):
+        if self._engine is not None:
+            self._engine.dispose()
+
+
+class AsyncDatabase:
+    """
+    asyncio counterpart of Database on top of aiosqlite (or any async driver),
+    the engine is created on first use, the schema before the first session
+    """
+
+    def __init__(self, config: Optional[DatabaseConfig] = None):
+        self.config = config or DatabaseConfig.from_env()
+        self._engine: Optional[AsyncEngine] = None
+        self._session_factory: Optional[async_sessionmaker] = None
+        self._schema_ready = False
+        self._lock = asyncio.Lock()
+
+    @property
+    def engine(self) -> AsyncEngine:
+        if self._engine is None:
+            self._engine = create_async_engine_from_config(self.config)
+            self._session_factory = async_sessionmaker(self._engine, expire_on_commit=False)
+        return self._engine
+
+    async def create_schema(self):
+        engine = self.engine
+        async with self._lock:
+            if not self._schema_ready:
+                async with engine.begin() as connection:
+                    await connection.run_sync(Base.metadata.create_all)
+                    await connection.run_sync(upgrade_connection)
+                self._schema_ready = True
+
+    async def session(self) -> AsyncSession:
+        if not self._schema_ready:
+            await self.create_schema()
+        return self._session_factory()
+
+    async def dispose(self):
+        if self._engine is not None:
+            await self._engine.dispose()
@@ -0,0 +1,45 @@
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class IdentityMap:
+    """
+    Per-transaction read-through cache of domain objects keyed by (type, id).
+    Repeated gets of the same object inside one unit of work return the same
+    instance without touching the database; the unit of work clears it
+    on commit and rollback.
+    """
+
+    def __init__(self):
+        self._objects: Dict[Tuple[type, Hashable], Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model: type, object_id: Hashable) -> Optional[Any]:
+        obj = self._objects.get((model, object_id))
+        if obj is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return obj
+
+    def add(self, model: type, object_id: Hashable, obj: Any):
+        self._objects[(model, object_id)] = obj
+
+    def get_or_load(self, model: type, object_id: Hashable, load: Callable[[], Any]) -> Any:
+        obj = self.get(model, object_id)
+        if obj is None:
+            obj = load()
+            self.add(model, object_id, obj)
+        return obj
+
+    def discard(self, model: type, object_id: Hashable):
+        self._objects.pop((model, object_id), None)
+
+    def clear(self):
+        self._objects.clear()
+
+    def __contains__(self, key: Tuple[type, Hashable]) -> bool:
+        return key in self._objects
+
+    def __len__(self) -> int:
+        return len(self._objects)
@@ -0,0 +1,59 @@
+"""
+In-place upgrades of SQLite databases created with an older schema.
+create_all() only creates missing tables, so columns, keys and indexes added
+to existing tables are applied here. Every step checks the current schema
+first, so upgrade() is safe to run on every start.
+"""
+from sqlalchemy import Connection, Engine, inspect, text
+
+from .orm import Base, OrderORM
+
+LINKS = OrderORM.order_product_assocoations
+
+
+def upgrade(engine: Engine):
+    with engine.begin() as connection:
+        upgrade_connection(connection)
+
+
+def upgrade_connection(connection: Connection):
+    inspector = inspect(connection)
+    # links get their surrogate key first, the totals are computed from them
+    if "id" not in {c["name"] for c in inspector.get_columns(LINKS.name)}:
+        _rebuild_links_with_primary_key(connection, inspector)
+    if "total" not in {c["name"] for c in inspector.get_columns("orders")}:
+        _add_order_totals(connection)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def _add_order_totals(connection):
+    connection.execute(text("ALTER TABLE orders ADD COLUMN total FLOAT NOT NULL DEFAULT 0"))
+    connection.execute(
+        text(
+            f"UPDATE orders SET total = ("
+            f" SELECT COALESCE(SUM(products.price), 0) FROM {LINKS.name}"
+            f" JOIN products ON products.id = {LINKS.name}.product_id"
+            f" WHERE {LINKS.name}.order_id = orders.id)"
+        )
+    )
+
+
+def _rebuild_links_with_primary_key(connection, inspector):
+    # SQLite can't add a primary key to an existing table: copy into a new one,
+    # keeping every link, repeated products included, in the order of insertion.
+    # The indexes follow the renamed table, they are dropped to free their names
+    old_name = f"{LINKS.name}_old"
+    old_indexes = inspector.get_indexes(LINKS.name)
+    connection.execute(text(f"ALTER TABLE {LINKS.name} RENAME TO {old_name}"))
+    for index in old_indexes:
+        connection.execute(text(f"DROP INDEX {index['name']}"))
+    LINKS.create(connection)
+    connection.execute(
+        text(
+            f"INSERT INTO {LINKS.name} (order_id, product_id)"
+            f" SELECT order_id, product_id FROM {old_name} ORDER BY rowid"
+        )
+    )
+    connection.execute(text(f"DROP TABLE {old_name}"))
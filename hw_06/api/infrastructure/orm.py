@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, Table, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Float, Table, ForeignKey, Index, text
 from sqlalchemy.orm import relationship, declarative_base
 
 Base = declarative_base()
@@ -7,7 +7,7 @@ Base = declarative_base()
 class ProductORM(Base):
     __tablename__ = 'products'
     id = Column(Integer, primary_key=True)
-    name = Column(String)
+    name = Column(String, index=True)
     quantity = Column(Integer)
     price = Column(Float)
 
@@ -15,14 +15,27 @@ class ProductORM(Base):
 class OrderORM(Base):
     __tablename__ = "orders"
     id = Column(Integer, primary_key=True)
+    # Denormalized order value: sum of product prices when the order was placed,
+    # maintained by the order repository
+    total = Column(Float, nullable=False, default=0.0, server_default=text("0"))
 
+    # An order may list a product several times, one link per occurrence, so the
+    # links have a surrogate key; the (order_id, product_id) index serves lookups by
+    # order, the product_id index serves "orders containing product X"
     order_product_assocoations = Table(
         'order_product_assocoations', Base.metadata,
-        Column('order_id', ForeignKey('orders.id')),
-        Column('product_id', ForeignKey('products.id'))
+        Column('id', Integer, primary_key=True),
+        Column('order_id', ForeignKey('orders.id'), nullable=False),
+        Column('product_id', ForeignKey('products.id'), nullable=False, index=True),
+        Index('ix_order_product_assocoations_order_id_product_id', 'order_id', 'product_id'),
     )
 
-    products = relationship("ProductORM", secondary=order_product_assocoations)
+    # Products in the order they were added
+    products = relationship(
+        "ProductORM",
+        secondary=order_product_assocoations,
+        order_by=order_product_assocoations.c.id,
+    )
 
 
 # Added CustomerORM
@@ -30,4 +43,4 @@ class CustomerORM(Base):
     __tablename__ = 'customers'
     id = Column(Integer, primary_key=True)
     name = Column(String)
-    email = Column(String)
+    email = Column(String, index=True)
@@ -0,0 +1,92 @@
+import logging
+import time
+from dataclasses import asdict, dataclass, field
+from typing import List, Set
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Statements running at least this long (seconds) go to the slow-query log
+SLOW_QUERY_THRESHOLD = 0.1
+
+
+@dataclass
+class SlowQuery:
+    statement: str
+    duration: float
+
+
+@dataclass
+class QuerySummary:
+    statements: int = 0
+    db_time: float = 0.0
+    slow_queries: List[SlowQuery] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class QueryStats:
+    """
+    Statement count, database time and slow statements of one session between start()
+    and stop(). The before/after_cursor_execute listeners are attached to the
+    connections the session begins transactions on and detached when the transaction
+    ends, so other sessions on the same engine neither show up in the summary nor pay
+    for the listeners, and a long-lived QueryStats holds no finished connections.
+    start() itself never touches the session: a session whose transaction has failed
+    can still be rolled back by the caller.
+    """
+
+    def __init__(self, session: Session, slow_threshold: float = SLOW_QUERY_THRESHOLD):
+        self.session = session
+        self.slow_threshold = slow_threshold
+        self.summary = QuerySummary()
+        self._listening = False
+        self._connections: Set[Connection] = set()
+        self._started_at = 0.0
+
+    def start(self):
+        self.summary = QuerySummary()
+        event.listen(self.session, "after_begin", self._after_begin)
+        event.listen(self.session, "after_transaction_end", self._after_transaction_end)
+        self._listening = True
+
+    def stop(self) -> QuerySummary:
+        if self._listening:
+            event.remove(self.session, "after_begin", self._after_begin)
+            event.remove(self.session, "after_transaction_end", self._after_transaction_end)
+            self._listening = False
+        self._release_connections()
+        return self.summary
+
+    def _after_begin(self, session, transaction, connection):
+        if connection not in self._connections:
+            self._connections.add(connection)
+            event.listen(connection, "before_cursor_execute", self._before_execute)
+            event.listen(connection, "after_cursor_execute", self._after_execute)
+
+    def _after_transaction_end(self, session, transaction):
+        # the connections go back to the pool with the outermost transaction
+        if transaction.parent is None:
+            self._release_connections()
+
+    def _release_connections(self):
+        for connection in self._connections:
+            event.remove(connection, "before_cursor_execute", self._before_execute)
+            event.remove(connection, "after_cursor_execute", self._after_execute)
+        self._connections.clear()
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # A session runs one statement at a time
+        self.summary.statements += 1
+        self._started_at = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - self._started_at
+        self.summary.db_time += duration
+        if duration >= self.slow_threshold:
+            self.summary.slow_queries.append(SlowQuery(statement, duration))
+            logger.warning("Slow query (%.3f s): %s", duration, statement)
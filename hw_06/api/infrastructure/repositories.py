@@ -1,15 +1,169 @@
-from typing import List
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Mapping, Optional, TypeVar
 
+from domain.exceptions import InsufficientStockError
 from domain.models import Order, Product, Customer
 from domain.repositories import ProductRepository, OrderRepository, CustomerRepository
-from sqlalchemy.orm import Session
+from sqlalchemy import Insert, Row, Select, Update, case, func, insert, select, update
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.orm.util import identity_key
 
+from .identity_map import IdentityMap
 from .orm import CustomerORM, OrderORM, ProductORM
 
+PRODUCT_COLUMNS = (ProductORM.id, ProductORM.name, ProductORM.quantity, ProductORM.price)
+CUSTOMER_COLUMNS = (CustomerORM.id, CustomerORM.name, CustomerORM.email)
+
+# Rows per executemany() call of add_many
+BATCH_SIZE = 1000
+# Order ids per IN query loading the products of orders
+ORDER_PRODUCTS_CHUNK = 500
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[list]:
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+
+def _page_query(columns: tuple, last_id: Optional[int], batch_size: int) -> Select:
+    id_column = columns[0]
+    query = select(*columns).order_by(id_column).limit(batch_size)
+    if last_id is not None:
+        query = query.where(id_column > last_id)
+    return query.execution_options(yield_per=batch_size)
+
+
+def _iter_rows(session: Session, columns: tuple, batch_size: int) -> Iterator[Row]:
+    """
+    Keyset pagination over plain column rows, the first column is the primary key.
+    Memory use is bounded by batch_size: no ORM objects and no identity map entries
+    are created, every page is fetched from the cursor batch_size rows at a time.
+    """
+    last_id = None
+    while True:
+        rows = 0
+        for row in session.execute(_page_query(columns, last_id, batch_size)):
+            rows += 1
+            last_id = row[0]
+            yield row
+        if rows < batch_size:
+            return
+
+
+T = TypeVar("T")
+
+
+def _get(
+    identity_map: Optional[IdentityMap], model: type, object_id: int, load: Callable[[], T]
+) -> T:
+    if identity_map is None:
+        return load()
+    return identity_map.get_or_load(model, object_id, load)
+
+
+def _insert_returning_ids(model: type) -> Insert:
+    # RETURNING rows come back in the order of the parameter sets, so the generated
+    # ids can be assigned to the domain objects of a multi-row INSERT
+    return insert(model).returning(model.id, sort_by_parameter_order=True)
+
+
+def _existing_products_query(product_ids: Iterable[int]) -> Select:
+    return select(ProductORM.id).where(ProductORM.id.in_(product_ids))
+
+
+def _check_products_found(product_ids: set, found_ids: Iterable[int]):
+    missing = product_ids - set(found_ids)
+    if missing:
+        raise NoResultFound(f"Products not found: {sorted(missing)}")
+
+
+def _refresh_totals(order_ids: List[int]) -> Update:
+    links = OrderORM.order_product_assocoations
+    total = (
+        select(func.coalesce(func.sum(ProductORM.price), 0.0))
+        .select_from(links)
+        .join(ProductORM, ProductORM.id == links.c.product_id)
+        .where(links.c.order_id == OrderORM.id)
+        .scalar_subquery()
+    )
+    return (
+        update(OrderORM)
+        .where(OrderORM.id.in_(order_ids))
+        .values(total=total)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _decrement_stock_query(quantities: Mapping[int, int]) -> Update:
+    """
+    One conditional UPDATE for a batch of products. The uncorrelated subquery is
+    evaluated once, so the statement changes either every row of the batch or none;
+    the arithmetic runs in the database, there is no read-modify-write in Python
+    """
+    product_ids = list(quantities)
+    stock = aliased(ProductORM)
+    in_stock = (
+        select(func.count())
+        .select_from(stock)
+        .where(stock.id.in_(product_ids), stock.quantity >= case(quantities, value=stock.id))
+        .scalar_subquery()
+    )
+    requested = case(quantities, value=ProductORM.id)
+    return (
+        update(ProductORM)
+        .where(
+            ProductORM.id.in_(product_ids),
+            ProductORM.quantity >= requested,
+            in_stock == len(product_ids),
+        )
+        .values(quantity=ProductORM.quantity - requested)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _in_stock_query(quantities: Mapping[int, int]) -> Select:
+    return select(ProductORM.id).where(
+        ProductORM.id.in_(list(quantities)),
+        ProductORM.quantity >= case(quantities, value=ProductORM.id),
+    )
+
+
+def _forget_products(
+    session: Session, identity_map: Optional[IdentityMap], product_ids: Iterable[int]
+):
+    # Cached domain objects and loaded ORM rows hold the old quantities
+    for product_id in product_ids:
+        if identity_map is not None:
+            identity_map.discard(Product, product_id)
+        product_orm = session.identity_map.get(identity_key(ProductORM, product_id))
+        if product_orm is not None:
+            session.expire(product_orm, ["quantity"])
+
+
+def _order_products_query(order_ids: List[int]) -> Select:
+    links = OrderORM.order_product_assocoations
+    return (
+        select(links.c.order_id, *PRODUCT_COLUMNS)
+        .join(ProductORM, ProductORM.id == links.c.product_id)
+        .where(links.c.order_id.in_(order_ids))
+        .order_by(links.c.id)
+    )
+
+
+def _group_order_products(order_ids: List[int], rows: Iterable[Row]) -> Iterator[Order]:
+    products = {order_id: [] for order_id in order_ids}
+    for order_id, *product in rows:
+        products[order_id].append(Product(*product))
+    for order_id in order_ids:
+        yield Order(id=order_id, products=products[order_id])
+
 
 class SqlAlchemyProductRepository(ProductRepository):
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, identity_map: Optional[IdentityMap] = None):
         self.session = session
+        self.identity_map = identity_map
 
     def add(self, product: Product):
         product_orm = ProductORM(
@@ -19,7 +173,20 @@ class SqlAlchemyProductRepository(ProductRepository):
         )
         self.session.add(product_orm)
 
+    def add_many(self, products: Iterable[Product]):
+        # Bulk INSERT ... RETURNING, no ORM objects are created
+        for chunk in _chunks(products, BATCH_SIZE):
+            product_ids = self.session.scalars(
+                _insert_returning_ids(ProductORM),
+                [{"name": p.name, "quantity": p.quantity, "price": p.price} for p in chunk],
+            ).all()
+            for product, product_id in zip(chunk, product_ids):
+                product.id = product_id
+
     def get(self, product_id: int) -> Product:
+        return _get(self.identity_map, Product, product_id, lambda: self._load(product_id))
+
+    def _load(self, product_id: int) -> Product:
         product_orm = self.session.query(ProductORM).filter_by(id=product_id).one()
         return Product(
             id=product_orm.id,
@@ -29,49 +196,115 @@ class SqlAlchemyProductRepository(ProductRepository):
         )
 
     def list(self) -> List[Product]:
-        products_orm = self.session.query(ProductORM).all()
-        return [
-            Product(id=p.id, name=p.name, quantity=p.quantity, price=p.price)
-            for p in products_orm
-        ]
+        # Column-only query: no ORM objects, no identity map overhead
+        rows = self.session.execute(select(*PRODUCT_COLUMNS).order_by(ProductORM.id))
+        return [Product(*row) for row in rows]
+
+    def iter_products(self, batch_size: int = BATCH_SIZE) -> Iterator[Product]:
+        for row in _iter_rows(self.session, PRODUCT_COLUMNS, batch_size):
+            yield Product(*row)
+
+    def decrement_stock(self, quantities: Mapping[int, int]):
+        # One statement per chunk; when a later chunk fails, the unit of work
+        # rolls back the ones already applied
+        for chunk in _chunks(quantities.items(), BATCH_SIZE):
+            chunk = dict(chunk)
+            _forget_products(self.session, self.identity_map, chunk)
+            if self.session.execute(_decrement_stock_query(chunk)).rowcount != len(chunk):
+                in_stock = self.session.scalars(_in_stock_query(chunk)).all()
+                raise InsufficientStockError(chunk.keys() - set(in_stock))
 
 
 class SqlAlchemyOrderRepository(OrderRepository):
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, identity_map: Optional[IdentityMap] = None):
         self.session = session
+        self.identity_map = identity_map
 
     def add(self, order: Order):
+        # All products are resolved with a single IN query
+        product_ids = {p.id for p in order.products}
+        products_orm = {
+            p.id: p
+            for p in self.session.scalars(
+                select(ProductORM).where(ProductORM.id.in_(product_ids))
+            )
+        }
+        _check_products_found(product_ids, products_orm)
         order_orm = OrderORM()
-        order_orm.products = [
-            self.session.query(ProductORM).filter_by(id=p.id).one()
-            for p in order.products
-        ]
+        order_orm.products = [products_orm[p.id] for p in order.products]
+        order_orm.total = sum(p.price for p in order_orm.products)
         self.session.add(order_orm)
 
+    def add_many(self, orders: Iterable[Order]):
+        # Orders are inserted as identical rows, so the ids returned by one multi-row
+        # INSERT can be assigned in any order; links are inserted with executemany
+        # and the totals are filled in by one UPDATE per chunk. Foreign keys are not
+        # enforced by SQLite, the products are checked with one IN query per chunk
+        for chunk in _chunks(orders, BATCH_SIZE):
+            product_ids = {p.id for order in chunk for p in order.products}
+            if product_ids:
+                found_ids = self.session.scalars(_existing_products_query(product_ids))
+                _check_products_found(product_ids, found_ids)
+            order_ids = self.session.scalars(
+                insert(OrderORM).returning(OrderORM.id), [{} for _ in chunk]
+            ).all()
+            links = []
+            for order, order_id in zip(chunk, order_ids):
+                order.id = order_id
+                links.extend({"order_id": order_id, "product_id": p.id} for p in order.products)
+            if links:
+                self.session.execute(insert(OrderORM.order_product_assocoations), links)
+                self.session.execute(_refresh_totals(order_ids))
+
+    def get_total(self, order_id: int) -> float:
+        # Primary key lookup of the denormalized column, products are not loaded
+        return self.session.scalars(select(OrderORM.total).where(OrderORM.id == order_id)).one()
+
+    def list_ids_by_product(self, product_id: int) -> List[int]:
+        # Served by the index on order_product_assocoations.product_id
+        links = OrderORM.order_product_assocoations
+        return self.session.scalars(
+            select(links.c.order_id)
+            .where(links.c.product_id == product_id)
+            .distinct()
+            .order_by(links.c.order_id)
+        ).all()
+
     def get(self, order_id: int) -> Order:
-        order_orm = self.session.query(OrderORM).filter_by(id=order_id).one()
-        products = [
-            Product(id=p.id, name=p.name, quantity=p.quantity, price=p.price)
-            for p in order_orm.products
-        ]
-        return Order(id=order_orm.id, products=products)
+        return _get(self.identity_map, Order, order_id, lambda: self._load(order_id))
 
-    def list(self) -> List[Product]:
-        orders_orm = self.session.query(OrderORM).all()
-        orders = []
-        for order_orm in orders_orm:
-            products = [
-                Product(id=p.id, name=p.name, quantity=p.quantity, price=p.price)
-                for p in order_orm.products
-            ]
-            orders.append(Order(id=order_orm.id, products=products))
-        return orders
+    def _load(self, order_id: int) -> Order:
+        self.session.scalars(select(OrderORM.id).where(OrderORM.id == order_id)).one()
+        return next(self._with_products([order_id]))
+
+    def list(self) -> List[Order]:
+        # Products of all orders are loaded by one extra SELECT ... IN query per chunk
+        order_ids = self.session.scalars(select(OrderORM.id).order_by(OrderORM.id)).all()
+        return [*self._with_products(order_ids)]
+
+    def _with_products(self, order_ids: List[int]) -> Iterator[Order]:
+        # The links are read as rows: loading the relationship would collapse
+        # a product the order lists several times into one
+        for chunk in _chunks(order_ids, ORDER_PRODUCTS_CHUNK):
+            rows = self.session.execute(_order_products_query(chunk))
+            yield from _group_order_products(chunk, rows)
+
+    def iter_orders(self, batch_size: int = BATCH_SIZE) -> Iterator[Order]:
+        """
+        Keyset pagination by id: two queries per page of batch_size orders,
+        plain rows only, so nothing accumulates in the session
+        """
+        for page in _chunks(_iter_rows(self.session, (OrderORM.id,), batch_size), batch_size):
+            order_ids = [row[0] for row in page]
+            rows = self.session.execute(_order_products_query(order_ids))
+            yield from _group_order_products(order_ids, rows)
 
 
 # Added SqlAlchemyCustomerRepository
 class SqlAlchemyCustomerRepository(CustomerRepository):
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, identity_map: Optional[IdentityMap] = None):
         self.session = session
+        self.identity_map = identity_map
 
     def add(self, customer: Customer):
         customer_orm = CustomerORM(
@@ -80,10 +313,26 @@ class SqlAlchemyCustomerRepository(CustomerRepository):
         )
         self.session.add(customer_orm)
 
+    def add_many(self, customers: Iterable[Customer]):
+        for chunk in _chunks(customers, BATCH_SIZE):
+            customer_ids = self.session.scalars(
+                _insert_returning_ids(CustomerORM),
+                [{"name": c.name, "email": c.email} for c in chunk],
+            ).all()
+            for customer, customer_id in zip(chunk, customer_ids):
+                customer.id = customer_id
+
     def get(self, customer_id: int) -> Customer:
+        return _get(self.identity_map, Customer, customer_id, lambda: self._load(customer_id))
+
+    def _load(self, customer_id: int) -> Customer:
         customer_orm = self.session.query(CustomerORM).filter_by(id=customer_id).one()
         return Customer(id=customer_orm.id, name=customer_orm.name, email=customer_orm.email)
 
     def list(self) -> List[Customer]:
-        customers_orm = self.session.query(CustomerORM).all()
-        return [Customer(id=c.id, name=c.name, email=c.email) for c in customers_orm]
+        rows = self.session.execute(select(*CUSTOMER_COLUMNS).order_by(CustomerORM.id))
+        return [Customer(*row) for row in rows]
+
+    def iter_customers(self, batch_size: int = BATCH_SIZE) -> Iterator[Customer]:
+        for row in _iter_rows(self.session, CUSTOMER_COLUMNS, batch_size):
+            yield Customer(*row)
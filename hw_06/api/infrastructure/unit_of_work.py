@@ -1,29 +1,53 @@
 # Added
+import logging
+from typing import Optional
+
 from domain.unit_of_work import UnitOfWork
 from sqlalchemy.orm import Session
 
+from .identity_map import IdentityMap
+from .query_stats import SLOW_QUERY_THRESHOLD, QueryStats, QuerySummary
 from .repositories import SqlAlchemyProductRepository, SqlAlchemyOrderRepository, SqlAlchemyCustomerRepository
 
+logger = logging.getLogger(__name__)
+
 
 class SqlAlchemyUnitOfWork(UnitOfWork):
 
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, slow_query_threshold: float = SLOW_QUERY_THRESHOLD):
         self.session = session
-        self.product_repo = SqlAlchemyProductRepository(session)
-        self.order_repo = SqlAlchemyOrderRepository(session)
-        self.customer_repo = SqlAlchemyCustomerRepository(session)
+        # Statements of the current transaction, summary is set when the with block exits
+        self.query_stats = QueryStats(session, slow_query_threshold)
+        self.summary: Optional[QuerySummary] = None
+        # Domain objects read in the current transaction, shared by the repositories
+        self.identity_map = IdentityMap()
+        self.product_repo = SqlAlchemyProductRepository(session, self.identity_map)
+        self.order_repo = SqlAlchemyOrderRepository(session, self.identity_map)
+        self.customer_repo = SqlAlchemyCustomerRepository(session, self.identity_map)
 
     def __enter__(self):
+        self.query_stats.start()
         return self
 
     def __exit__(self, exception_type, exception_value, traceback):
-        if exception_type is None:
-            self.commit()
-        else:
-            self.rollback()
+        try:
+            if exception_type is None:
+                try:
+                    self.commit()
+                except BaseException:
+                    # a failed flush or commit leaves the session unusable until rollback
+                    self.rollback()
+                    raise
+            else:
+                self.rollback()
+        finally:
+            self.summary = self.query_stats.stop()
+            logger.debug("Unit of work: %s", self.summary.as_dict())
 
     def commit(self):
         self.session.commit()
+        self.identity_map.clear()
 
     def rollback(self):
         self.session.rollback()
+        self.identity_map.clear()
@@ -1,9 +1,5 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-
 from domain.services import WarehouseService
-from infrastructure.database import DATABASE_URL
-from infrastructure.orm import Base
+from infrastructure.database import Database, DatabaseConfig
 from infrastructure.repositories import (
     SqlAlchemyProductRepository,
     SqlAlchemyOrderRepository,
@@ -11,13 +7,12 @@ from infrastructure.repositories import (
 )
 from infrastructure.unit_of_work import SqlAlchemyUnitOfWork
 
-engine = create_engine(DATABASE_URL)
-SessionFactory = sessionmaker(bind=engine)
-Base.metadata.create_all(engine)
+# Engine and schema are created on the first session, not on import
+database = Database(DatabaseConfig.from_env())
 
 
 def main():
-    session = SessionFactory()
+    session = database.session()
     product_repo = SqlAlchemyProductRepository(session)
     order_repo = SqlAlchemyOrderRepository(session)
     customer_repo = SqlAlchemyCustomerRepository(session)
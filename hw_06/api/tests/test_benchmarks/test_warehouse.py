@@ -0,0 +1,21 @@
+import unittest
+
+from benchmarks import warehouse
+
+
+class TestWarehouseBenchmark(unittest.TestCase):
+    def test_no_scenario_exceeds_query_budget(self):
+        results = warehouse.run(50)
+        self.assertEqual([r.name for r in results], list(warehouse.SCENARIOS))
+        self.assertEqual(warehouse.over_budget(results), [])
+        for r in results:
+            self.assertGreater(r.rows_per_sec, 0, r.name)
+            self.assertGreater(r.statements, 0, r.name)
+
+    def test_over_budget(self):
+        result = warehouse.Result("order_repo.list", calls=3, rows=150, seconds=1.0, statements=153)
+        self.assertEqual(warehouse.over_budget([result]), [result])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 # Added
 import unittest
 from unittest.mock import MagicMock
+from domain.exceptions import InsufficientStockError
 from domain.models import Product, Order, Customer
 from domain.services import WarehouseService
 
@@ -31,6 +32,49 @@ class TestWarehouseService(unittest.TestCase):
         self.assertEqual(customer.name, "Test Customer")
         self.assertEqual(customer.email, "test@example.com")
 
+    def test_create_products(self):
+        products = self.service.create_products(
+            [{"name": "A", "quantity": 1, "price": 1.0}, {"name": "B", "quantity": 2, "price": 2.0}]
+        )
+        self.product_repo.add_many.assert_called_once_with(products)
+        self.assertEqual([p.name for p in products], ["A", "B"])
+
+    def test_create_orders(self):
+        product = Product(id=1, name="Test Product", quantity=10, price=100.0)
+        orders = self.service.create_orders([[product], [product, product]])
+        self.order_repo.add_many.assert_called_once_with(orders)
+        self.assertEqual([len(o.products) for o in orders], [1, 2])
+
+    def test_create_customers(self):
+        customers = self.service.create_customers([{"name": "Test Customer", "email": "test@example.com"}])
+        self.customer_repo.add_many.assert_called_once_with(customers)
+        self.assertEqual(customers[0].email, "test@example.com")
+
+    def test_place_order_reserves_stock(self):
+        first = Product(id=1, name="A", quantity=10, price=1.0)
+        second = Product(id=2, name="B", quantity=10, price=2.0)
+        order = self.service.place_order([first, second, second])
+        self.product_repo.decrement_stock.assert_called_once_with({1: 1, 2: 2})
+        self.order_repo.add.assert_called_once_with(order)
+
+    def test_place_order_out_of_stock(self):
+        self.product_repo.decrement_stock.side_effect = InsufficientStockError([1])
+        with self.assertRaises(InsufficientStockError):
+            self.service.place_order([Product(id=1, name="A", quantity=0, price=1.0)])
+        self.order_repo.add.assert_not_called()
+
+    def test_place_orders_reserves_once(self):
+        product = Product(id=1, name="A", quantity=10, price=1.0)
+        orders = self.service.place_orders([[product], [product, product]])
+        self.product_repo.decrement_stock.assert_called_once_with({1: 3})
+        self.order_repo.add_many.assert_called_once_with(orders)
+
+    def test_reserve_stock_rejects_non_positive(self):
+        with self.assertRaises(ValueError):
+            self.service.reserve_stock({1: 0})
+        self.service.reserve_stock({1: 2})
+        self.product_repo.decrement_stock.assert_called_once_with({1: 2})
+
 
 if __name__ == '__main__':
     unittest.main()
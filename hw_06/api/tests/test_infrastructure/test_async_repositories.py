@@ -0,0 +1,142 @@
+import unittest
+
+from domain.exceptions import InsufficientStockError
+from domain.models import Customer, Order, Product
+from domain.services import AsyncWarehouseService
+from infrastructure.async_unit_of_work import AsyncSqlAlchemyUnitOfWork
+from infrastructure.database import AsyncDatabase, DatabaseConfig, async_url
+from sqlalchemy.exc import NoResultFound
+
+
+class TestAsyncRepositories(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.database = AsyncDatabase(DatabaseConfig(url="sqlite://"))
+        self.session = await self.database.session()
+        self.uow = AsyncSqlAlchemyUnitOfWork(self.session)
+        async with self.uow:
+            await self.uow.product_repo.add_many(
+                [Product(id=None, name=f"p{i}", quantity=i, price=float(i)) for i in range(5)]
+            )
+            await self.uow.customer_repo.add_many(
+                [Customer(id=None, name=f"c{i}", email=f"c{i}@example.com") for i in range(3)]
+            )
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.database.dispose()
+
+    def test_async_url(self):
+        self.assertEqual(async_url("sqlite:///warehouse.db"), "sqlite+aiosqlite:///warehouse.db")
+        self.assertEqual(async_url("sqlite://"), "sqlite+aiosqlite://")
+        self.assertEqual(async_url("postgresql+asyncpg://db/wh"), "postgresql+asyncpg://db/wh")
+
+    async def test_products_and_customers(self):
+        async with self.uow:
+            self.uow.product_repo.add(Product(id=None, name="extra", quantity=1, price=9.0))
+        async with self.uow:
+            products = await self.uow.product_repo.list()
+            self.assertEqual([p.name for p in products], ["p0", "p1", "p2", "p3", "p4", "extra"])
+            streamed = [p async for p in self.uow.product_repo.iter_products(batch_size=4)]
+            self.assertEqual(streamed, products)
+            customers = [c async for c in self.uow.customer_repo.iter_customers(batch_size=2)]
+            self.assertEqual(customers, await self.uow.customer_repo.list())
+            self.assertEqual((await self.uow.customer_repo.get(2)).email, "c1@example.com")
+
+    async def test_orders(self):
+        async with self.uow:
+            products = await self.uow.product_repo.list()
+            await self.uow.order_repo.add(Order(id=None, products=products[:2]))
+            await self.uow.order_repo.add_many(
+                [Order(id=None, products=products[i:i + 2]) for i in range(1, 4)]
+            )
+        async with self.uow:
+            orders = await self.uow.order_repo.list()
+            self.assertEqual([o.total for o in orders], [1.0, 3.0, 5.0, 7.0])
+            streamed = [o async for o in self.uow.order_repo.iter_orders(batch_size=3)]
+            self.assertEqual(streamed, orders)
+            self.assertEqual(await self.uow.order_repo.get_total(4), 7.0)
+            self.assertEqual(await self.uow.order_repo.list_ids_by_product(3), [2, 3])
+
+    async def test_order_with_missing_product(self):
+        with self.assertRaises(NoResultFound):
+            async with self.uow:
+                await self.uow.order_repo.add(
+                    Order(id=None, products=[Product(id=42, name="x", quantity=1, price=1.0)])
+                )
+        async with self.uow:
+            self.assertEqual(await self.uow.order_repo.list(), [])
+
+    async def test_repeated_products(self):
+        async with self.uow:
+            products = await self.uow.product_repo.list()
+            await self.uow.order_repo.add(Order(id=None, products=[products[2], products[2]]))
+            await self.uow.order_repo.add_many([Order(id=None, products=[products[2], products[2]])])
+        async with self.uow:
+            orders = await self.uow.order_repo.list()
+            self.assertEqual([len(o.products) for o in orders], [2, 2])
+            self.assertEqual(
+                [await self.uow.order_repo.get_total(o.id) for o in orders], [4.0, 4.0]
+            )
+
+    async def test_add_many_checks_products_and_assigns_ids(self):
+        missing = Product(id=42, name="x", quantity=1, price=1.0)
+        with self.assertRaises(NoResultFound):
+            async with self.uow:
+                await self.uow.order_repo.add_many([Order(id=None, products=[missing])])
+        service = AsyncWarehouseService(
+            self.uow.product_repo, self.uow.order_repo, self.uow.customer_repo
+        )
+        async with self.uow:
+            self.assertEqual(await self.uow.order_repo.list(), [])
+            products = await service.create_products(
+                [{"name": "a", "quantity": 1, "price": 1.0}, {"name": "b", "quantity": 1, "price": 2.0}]
+            )
+            customers = await service.create_customers([{"name": "d", "email": "d@example.com"}])
+        self.assertEqual([p.id for p in products], [6, 7])
+        async with self.uow:
+            self.assertEqual((await self.uow.product_repo.get(7)).name, "b")
+            self.assertEqual((await self.uow.customer_repo.get(customers[0].id)).name, "d")
+
+    async def test_identity_map(self):
+        async with self.uow:
+            product = await self.uow.product_repo.get(1)
+            self.assertIs(await self.uow.product_repo.get(1), product)
+            self.assertEqual(self.uow.identity_map.hits, 1)
+        self.assertEqual(len(self.uow.identity_map), 0)
+
+    async def test_summary(self):
+        async with self.uow:
+            await self.uow.product_repo.list()
+            await self.uow.order_repo.list()
+        self.assertEqual(self.uow.summary.statements, 2)
+
+    async def test_service(self):
+        service = AsyncWarehouseService(
+            self.uow.product_repo, self.uow.order_repo, self.uow.customer_repo
+        )
+        async with self.uow:
+            await service.create_products([{"name": "bulk", "quantity": 1, "price": 2.5}])
+        async with self.uow:
+            bulk = (await self.uow.product_repo.list())[-1]
+            await service.create_order([bulk])
+        async with self.uow:
+            self.assertEqual(await self.uow.order_repo.get_total(1), 2.5)
+
+    async def test_place_orders_reserves_stock(self):
+        service = AsyncWarehouseService(
+            self.uow.product_repo, self.uow.order_repo, self.uow.customer_repo
+        )
+        async with self.uow:
+            products = await self.uow.product_repo.list()
+            await service.place_orders([products[1:3], products[2:4]])
+        with self.assertRaises(InsufficientStockError):
+            async with self.uow:
+                await service.place_order(products[1:3])
+        async with self.uow:
+            products = await self.uow.product_repo.list()
+            self.assertEqual([p.quantity for p in products], [0, 0, 0, 2, 4])
+            self.assertEqual(len(await self.uow.order_repo.list()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,12 @@
 # Added
+import os
+import tempfile
 import unittest
+from unittest.mock import patch
 
-from infrastructure.database import DATABASE_URL
+from infrastructure.database import DATABASE_URL, Database, DatabaseConfig
 from infrastructure.orm import Base, ProductORM, CustomerORM
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
 
 
@@ -36,5 +39,98 @@ class TestORM(unittest.TestCase):
         self.assertEqual(retrieved_customer.email, "test@example.com")
 
 
+class TestDatabase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.url = f"sqlite:///{os.path.join(self.tmp.name, 'warehouse.db')}"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_sqlite_profile(self):
+        database = Database(DatabaseConfig(url=self.url, sqlite_cache_size=-2000))
+        with database.engine.connect() as connection:
+            self.assertEqual(connection.execute(text("PRAGMA journal_mode")).scalar(), "wal")
+            self.assertEqual(connection.execute(text("PRAGMA synchronous")).scalar(), 1)
+            self.assertEqual(connection.execute(text("PRAGMA cache_size")).scalar(), -2000)
+        self.assertEqual(database.engine.pool.size(), 5)
+        database.dispose()
+
+    def test_schema_created_lazily(self):
+        database = Database(DatabaseConfig(url=self.url))
+        self.assertIsNone(database._engine)
+        self.assertEqual(inspect(database.engine).get_table_names(), [])
+        session = database.session()
+        self.assertIn("products", inspect(database.engine).get_table_names())
+        session.close()
+        database.dispose()
+
+    def test_upgrade_old_schema(self):
+        engine = create_engine(self.url)
+        with engine.begin() as connection:
+            for statement in (
+                "CREATE TABLE products (id INTEGER PRIMARY KEY, name VARCHAR, quantity INTEGER, price FLOAT)",
+                "CREATE TABLE orders (id INTEGER PRIMARY KEY)",
+                "CREATE TABLE customers (id INTEGER PRIMARY KEY, name VARCHAR, email VARCHAR)",
+                "CREATE TABLE order_product_assocoations (order_id INTEGER, product_id INTEGER)",
+                "INSERT INTO products (name, quantity, price) VALUES ('a', 1, 2.5), ('b', 1, 4.0)",
+                "INSERT INTO orders (id) VALUES (1)",
+                "INSERT INTO order_product_assocoations VALUES (1, 1), (1, 2), (1, 2)",
+            ):
+                connection.execute(text(statement))
+        engine.dispose()
+
+        database = Database(DatabaseConfig(url=self.url))
+        database.create_schema()
+        inspector = inspect(database.engine)
+        self.assertEqual(
+            inspector.get_pk_constraint("order_product_assocoations")["constrained_columns"], ["id"]
+        )
+        self.assertEqual(
+            {i["name"] for i in inspector.get_indexes("order_product_assocoations")},
+            {"ix_order_product_assocoations_product_id", "ix_order_product_assocoations_order_id_product_id"},
+        )
+        self.assertIn("ix_customers_email", {i["name"] for i in inspector.get_indexes("customers")})
+        with database.engine.connect() as connection:
+            # repeated links are kept, each counts towards the total
+            self.assertEqual(connection.execute(text("SELECT total FROM orders")).scalar(), 10.5)
+            links = connection.execute(text("SELECT product_id FROM order_product_assocoations ORDER BY id"))
+            self.assertEqual(links.scalars().all(), [1, 2, 2])
+        database.create_schema()
+        database.dispose()
+
+    def test_upgrade_links_with_composite_key(self):
+        engine = create_engine(self.url)
+        with engine.begin() as connection:
+            for statement in (
+                "CREATE TABLE products (id INTEGER PRIMARY KEY, name VARCHAR, quantity INTEGER, price FLOAT)",
+                "CREATE TABLE orders (id INTEGER PRIMARY KEY, total FLOAT NOT NULL DEFAULT 0)",
+                "CREATE TABLE order_product_assocoations (order_id INTEGER, product_id INTEGER,"
+                " PRIMARY KEY (order_id, product_id))",
+                "CREATE INDEX ix_order_product_assocoations_product_id ON order_product_assocoations (product_id)",
+                "INSERT INTO order_product_assocoations VALUES (1, 2), (1, 1)",
+            ):
+                connection.execute(text(statement))
+        engine.dispose()
+
+        database = Database(DatabaseConfig(url=self.url))
+        database.create_schema()
+        with database.engine.connect() as connection:
+            links = connection.execute(text("SELECT product_id FROM order_product_assocoations ORDER BY id"))
+            self.assertEqual(links.scalars().all(), [2, 1])
+        database.dispose()
+
+    def test_config_from_env(self):
+        env = {"WAREHOUSE_DB_POOL_SIZE": "20", "WAREHOUSE_DB_ECHO": "true", "WAREHOUSE_DB_URL": "sqlite://"}
+        with patch.dict(os.environ, env):
+            config = DatabaseConfig.from_env()
+        self.assertEqual(config.pool_size, 20)
+        self.assertTrue(config.echo)
+        self.assertTrue(config.is_memory)
+        # one variable per setting, no other name changes the URL
+        with patch.dict(os.environ, {"WAREHOUSE_DATABASE_URL": "sqlite://"}):
+            self.assertEqual(DatabaseConfig.from_env().url, DATABASE_URL)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,239 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from domain.exceptions import InsufficientStockError
+from domain.models import Customer, Order, Product
+from domain.services import WarehouseService
+from infrastructure.database import Database, DatabaseConfig
+from infrastructure.identity_map import IdentityMap
+from infrastructure.orm import Base, OrderORM, ProductORM
+from infrastructure.repositories import (
+    SqlAlchemyCustomerRepository,
+    SqlAlchemyOrderRepository,
+    SqlAlchemyProductRepository,
+)
+from infrastructure.unit_of_work import SqlAlchemyUnitOfWork
+from sqlalchemy import create_engine, event, func, select, text
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.orm import sessionmaker
+
+
+class TestRepositories(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.product_repo = SqlAlchemyProductRepository(self.session)
+        self.order_repo = SqlAlchemyOrderRepository(self.session)
+        self.customer_repo = SqlAlchemyCustomerRepository(self.session)
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    def count_statements(self):
+        statements = []
+        event.listen(
+            self.engine,
+            "before_cursor_execute",
+            lambda conn, cursor, statement, *args: statements.append(statement),
+        )
+        return statements
+
+    def seed_orders(self, n_orders, n_products=5):
+        self.product_repo.add_many(
+            [Product(id=None, name=f"p{i}", quantity=1, price=1.0) for i in range(n_products)]
+        )
+        products = self.product_repo.list()
+        self.order_repo.add_many(
+            [Order(id=None, products=products[: i % n_products + 1]) for i in range(n_orders)]
+        )
+        self.session.commit()
+        return products
+
+    def test_product_add_many(self):
+        products = [Product(id=None, name=f"p{i}", quantity=i, price=i * 1.5) for i in range(2500)]
+        self.product_repo.add_many(products)
+        self.session.commit()
+        listed = self.product_repo.list()
+        self.assertEqual(len(listed), 2500)
+        self.assertEqual(listed[-1].name, "p2499")
+        self.assertEqual(listed[-1].price, 2499 * 1.5)
+        self.assertEqual([p.id for p in products], [p.id for p in listed])
+
+    def test_customer_add_many(self):
+        self.customer_repo.add_many(Customer(id=None, name=f"c{i}", email=f"c{i}@example.com") for i in range(10))
+        self.session.commit()
+        self.assertEqual([c.email for c in self.customer_repo.list()][:2], ["c0@example.com", "c1@example.com"])
+        customers = [Customer(id=None, name="d", email="d@example.com")]
+        self.customer_repo.add_many(customers)
+        self.assertEqual(self.customer_repo.get(customers[0].id).email, "d@example.com")
+
+    def test_order_add_many(self):
+        self.product_repo.add_many([Product(id=None, name=f"p{i}", quantity=1, price=1.0) for i in range(3)])
+        products = self.product_repo.list()
+        orders = [Order(id=None, products=products[:i]) for i in range(1, 4)]
+        self.order_repo.add_many(orders)
+        self.session.commit()
+        self.assertEqual(len({o.id for o in orders}), 3)
+        for order in orders:
+            stored = self.order_repo.get(order.id)
+            self.assertEqual([p.id for p in stored.products], [p.id for p in order.products])
+        self.assertEqual(self.session.scalar(select(func.count()).select_from(OrderORM)), 3)
+        self.assertEqual(self.session.scalar(select(func.count()).select_from(ProductORM)), 3)
+
+    def test_orders_may_repeat_products(self):
+        self.product_repo.add_many(
+            [Product(id=None, name=f"p{i}", quantity=5, price=1.0) for i in range(2)]
+        )
+        products = self.product_repo.list()
+        service = WarehouseService(self.product_repo, self.order_repo, self.customer_repo)
+        service.place_order([products[1], products[0], products[1]])
+        service.place_orders([[products[0], products[0]]])
+        self.session.commit()
+        self.assertEqual([p.id for p in self.order_repo.get(1).products], [2, 1, 2])
+        self.assertEqual([self.order_repo.get_total(i) for i in (1, 2)], [3.0, 2.0])
+        self.assertEqual([len(o.products) for o in self.order_repo.iter_orders()], [3, 2])
+        self.assertEqual(self.order_repo.list_ids_by_product(1), [1, 2])
+        self.assertEqual([p.quantity for p in self.product_repo.list()], [2, 3])
+
+    def test_order_add_many_checks_products(self):
+        products = self.seed_orders(0, n_products=2)
+        missing = Product(id=100500, name="x", quantity=1, price=1.0)
+        with self.assertRaises(NoResultFound):
+            self.order_repo.add_many([Order(id=None, products=products), Order(id=None, products=[missing])])
+        self.session.rollback()
+        self.assertEqual(self.session.scalar(select(func.count()).select_from(OrderORM)), 0)
+
+    def test_order_add_resolves_products_in_one_query(self):
+        products = self.seed_orders(0, n_products=10)
+        statements = self.count_statements()
+        self.order_repo.add(Order(id=None, products=products))
+        self.session.flush()
+        selects = [s for s in statements if s.startswith("SELECT")]
+        self.assertEqual(len(selects), 1)
+        with self.assertRaises(NoResultFound):
+            missing = Product(id=100500, name="x", quantity=1, price=1.0)
+            self.order_repo.add(Order(id=None, products=[missing]))
+
+    def test_order_list_has_no_n_plus_one(self):
+        self.seed_orders(50)
+        statements = self.count_statements()
+        orders = self.order_repo.list()
+        self.assertEqual(len(orders), 50)
+        self.assertEqual(len(statements), 2)
+        self.assertEqual([len(o.products) for o in orders[:6]], [1, 2, 3, 4, 5, 1])
+
+    def test_iter_orders_pages(self):
+        self.seed_orders(25)
+        self.session.expunge_all()
+        statements = self.count_statements()
+        orders = list(self.order_repo.iter_orders(batch_size=10))
+        self.assertEqual([o.id for o in orders], list(range(1, 26)))
+        # three pages of two queries, the last page is not full
+        self.assertEqual(len(statements), 6)
+        self.assertEqual(len(self.session.identity_map), 0)
+        self.assertEqual([len(o.products) for o in orders], [i % 5 + 1 for i in range(25)])
+
+    def test_iter_products_and_customers_stream_plain_rows(self):
+        self.product_repo.add_many(
+            [Product(id=None, name=f"p{i}", quantity=i, price=1.0) for i in range(35)]
+        )
+        self.customer_repo.add_many(
+            [Customer(id=None, name=f"c{i}", email=f"c{i}@example.com") for i in range(20)]
+        )
+        self.session.commit()
+        statements = self.count_statements()
+        products = self.product_repo.iter_products(batch_size=10)
+        self.assertEqual(next(products), Product(id=1, name="p0", quantity=0, price=1.0))
+        self.assertEqual(len(statements), 1)
+        self.assertEqual([p.quantity for p in products], list(range(1, 35)))
+        self.assertEqual(len(statements), 4)
+        self.assertEqual(len(list(self.customer_repo.iter_customers(batch_size=10))), 20)
+        self.assertEqual(self.product_repo.list()[-1].name, "p34")
+        self.assertEqual(len(self.session.identity_map), 0)
+
+    def test_order_totals_and_product_lookup(self):
+        products = self.seed_orders(4, n_products=3)
+        order = Order(id=None, products=products[1:])
+        self.order_repo.add(order)
+        self.session.flush()
+        self.assertEqual(self.order_repo.get_total(1), 1.0)
+        self.assertEqual(self.order_repo.get_total(3), 3.0)
+        self.assertEqual(self.order_repo.get_total(5), order.total)
+        self.assertEqual(self.order_repo.list_ids_by_product(products[2].id), [3, 5])
+
+    def test_product_lookups_use_indexes(self):
+        self.seed_orders(3)
+        plans = {
+            "orders by product": "SELECT order_id FROM order_product_assocoations WHERE product_id = 1",
+            "customer by email": "SELECT id FROM customers WHERE email = 'c@example.com'",
+            "product by name": "SELECT id FROM products WHERE name = 'p1'",
+        }
+        for name, query in plans.items():
+            plan = " ".join(row[-1] for row in self.session.execute(text("EXPLAIN QUERY PLAN " + query)))
+            self.assertIn("USING", plan, name)
+
+    def test_decrement_stock_is_one_statement_all_or_nothing(self):
+        self.product_repo.add_many(
+            [Product(id=None, name=f"p{i}", quantity=5, price=1.0) for i in range(3)]
+        )
+        self.session.commit()
+        statements = self.count_statements()
+        self.product_repo.decrement_stock({1: 5, 2: 1, 3: 2})
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith("UPDATE"))
+        with self.assertRaises(InsufficientStockError) as raised:
+            self.product_repo.decrement_stock({1: 1, 2: 1, 100500: 1})
+        self.assertEqual(raised.exception.product_ids, [1, 100500])
+        self.assertEqual([p.quantity for p in self.product_repo.list()], [0, 4, 3])
+
+    def test_decrement_stock_invalidates_cached_products(self):
+        self.product_repo.identity_map = IdentityMap()
+        self.seed_orders(0, n_products=2)
+        self.session.scalars(select(ProductORM)).all()
+        self.assertEqual(self.product_repo.get(1).quantity, 1)
+        self.product_repo.decrement_stock({1: 1})
+        self.assertEqual(self.product_repo.get(1).quantity, 0)
+
+
+class TestConcurrentOrders(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        url = "sqlite:///" + os.path.join(self.tmp.name, "warehouse.db")
+        self.database = Database(DatabaseConfig(url=url))
+        with SqlAlchemyUnitOfWork(self.database.session()) as uow:
+            uow.product_repo.add_many(
+                [Product(id=None, name=f"p{i}", quantity=10 - 5 * i, price=1.0) for i in range(2)]
+            )
+
+    def tearDown(self):
+        self.database.dispose()
+        self.tmp.cleanup()
+
+    def place_order(self, product_ids):
+        session = self.database.session()
+        try:
+            uow = SqlAlchemyUnitOfWork(session)
+            service = WarehouseService(uow.product_repo, uow.order_repo, uow.customer_repo)
+            with uow:
+                service.place_order([uow.product_repo.get(pid) for pid in product_ids])
+            return True
+        except InsufficientStockError:
+            return False
+        finally:
+            session.close()
+
+    def test_stock_never_oversold(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            placed = list(pool.map(self.place_order, [[1, 2]] * 12))
+        self.assertEqual(placed.count(True), 5)
+        with SqlAlchemyUnitOfWork(self.database.session()) as uow:
+            self.assertEqual([p.quantity for p in uow.product_repo.list()], [5, 0])
+            self.assertEqual(len(uow.order_repo.list()), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+
+from domain.models import Customer, Order, Product
+from infrastructure.orm import Base, CustomerORM
+from infrastructure.query_stats import QueryStats
+from infrastructure.unit_of_work import SqlAlchemyUnitOfWork
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+
+class TestUnitOfWork(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.uow = SqlAlchemyUnitOfWork(self.session)
+        with self.uow:
+            self.uow.product_repo.add_many(
+                [Product(id=None, name=f"p{i}", quantity=i, price=1.0) for i in range(3)]
+            )
+            self.uow.customer_repo.add(Customer(id=None, name="c", email="c@example.com"))
+            self.uow.order_repo.add_many([Order(id=None, products=self.uow.product_repo.list())])
+        self.statements = []
+        event.listen(
+            self.engine,
+            "before_cursor_execute",
+            lambda conn, cursor, statement, *args: self.statements.append(statement),
+        )
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    def test_repeated_get_hits_identity_map(self):
+        with self.uow:
+            product = self.uow.product_repo.get(1)
+            self.assertIs(self.uow.product_repo.get(1), product)
+            self.assertIs(self.uow.customer_repo.get(1), self.uow.customer_repo.get(1))
+            self.assertIs(self.uow.order_repo.get(1), self.uow.order_repo.get(1))
+            self.assertEqual(self.uow.product_repo.get(2).name, "p1")
+        # product 1, product 2, customer 1 and order 1 with its products
+        self.assertEqual(len([s for s in self.statements if s.startswith("SELECT")]), 5)
+        self.assertEqual(self.uow.identity_map.hits, 3)
+
+    def test_identity_map_cleared_on_commit_and_rollback(self):
+        with self.uow:
+            first = self.uow.product_repo.get(1)
+        self.assertEqual(len(self.uow.identity_map), 0)
+        with self.uow:
+            second = self.uow.product_repo.get(1)
+        self.assertIsNot(first, second)
+        with self.assertRaises(RuntimeError):
+            with self.uow:
+                self.uow.product_repo.get(1)
+                raise RuntimeError
+        self.assertEqual(len(self.uow.identity_map), 0)
+
+    def test_summary_counts_statements_of_the_transaction(self):
+        with self.uow:
+            self.uow.product_repo.get(1)
+            self.uow.order_repo.get(1)
+            self.uow.customer_repo.add(Customer(id=None, name="d", email="d@example.com"))
+        summary = self.uow.summary
+        # product, order with its products, the flushed customer
+        self.assertEqual(summary.statements, 4)
+        self.assertGreater(summary.db_time, 0)
+        self.assertEqual(summary.slow_queries, [])
+        listener = self.uow.query_stats._before_execute
+        self.assertFalse(event.contains(self.engine, "before_cursor_execute", listener))
+
+    def test_summary_ignores_other_sessions(self):
+        other = sessionmaker(bind=self.engine)()
+        with self.uow:
+            self.uow.product_repo.list()
+            other.execute(text("SELECT 1"))
+            # listeners live on the session's connection, not on the engine
+            listener = self.uow.query_stats._before_execute
+            self.assertFalse(event.contains(self.engine, "before_cursor_execute", listener))
+        other.close()
+        self.assertEqual(self.uow.summary.statements, 1)
+
+    def test_stats_release_finished_connections(self):
+        stats = QueryStats(self.session)
+        stats.start()
+        for _ in range(3):
+            with self.uow:
+                self.uow.product_repo.list()
+            self.assertEqual(stats._connections, set())
+        self.session.execute(text("SELECT 1"))
+        self.session.rollback()
+        self.assertEqual(stats.stop().statements, 4)
+        self.assertEqual(stats._connections, set())
+
+    def test_slow_queries_logged(self):
+        uow = SqlAlchemyUnitOfWork(self.session, slow_query_threshold=0)
+        with self.assertLogs("infrastructure.query_stats", level="WARNING") as logs:
+            with uow:
+                uow.product_repo.list()
+        self.assertEqual(len(uow.summary.slow_queries), 1)
+        self.assertTrue(uow.summary.slow_queries[0].statement.startswith("SELECT"))
+        self.assertIn("Slow query", logs.output[0])
+        self.assertEqual(uow.summary.as_dict()["statements"], 1)
+
+    def test_summary_on_rollback(self):
+        with self.assertRaises(RuntimeError):
+            with self.uow:
+                self.uow.product_repo.list()
+                raise RuntimeError
+        self.assertEqual(self.uow.summary.statements, 1)
+
+    def test_recovers_after_failed_commit(self):
+        with self.assertRaises(IntegrityError):
+            with self.uow:
+                self.uow.customer_repo.add(Customer(id=None, name="d", email="d@example.com"))
+                self.session.add(CustomerORM(id=1, name="dup", email="dup@example.com"))
+        with self.uow:
+            self.assertEqual([c.name for c in self.uow.customer_repo.list()], ["c"])
+
+
+if __name__ == '__main__':
+    unittest.main()
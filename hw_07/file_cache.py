@@ -0,0 +1,243 @@
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+
+MAX_BYTES = 64 * 1024 * 1024  # bodies of small files and their compressed variants
+MAX_FILE_SIZE = 256 * 1024  # larger files are sent with sendfile from a cached descriptor
+MAX_OPEN_FILES = 256  # descriptors of large files kept open
+CHECK_INTERVAL = 1.0  # seconds an entry is trusted before it is checked with stat()
+
+# Precompressed siblings loaded along with a file: index.html.br, index.html.gz
+SIBLINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class CachedFile:
+    """
+    A file under DOCUMENT_ROOT: the contents of a small file, or an open descriptor
+    of a large one, plus the response head rendered once. Compressed representations
+    of the same file hang off variants, keyed by content coding.
+    """
+
+    __slots__ = ('path', 'size', 'mtime_ns', 'inode', 'etag', 'encoding', 'variants',
+                 'signature', 'head', 'body', 'response', 'fd', 'checked_at')
+
+    def __init__(self, path, size, mtime_ns, inode, body=None, fd=None, encoding=None):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.inode = inode
+        self.etag = f'"{self.size:x}-{self.mtime_ns:x}"'
+        self.encoding = encoding  # Content-Encoding of a variant, None for the file itself
+        self.variants = {}
+        self.signature = None  # stat() of the file and its siblings when it was loaded
+        self.head = b''
+        self.body = body
+        self.response = None  # head + body of a small file, sent with one sendall()
+        self.fd = fd
+        self.checked_at = 0.0
+
+    @property
+    def mtime(self):
+        return self.mtime_ns / 1e9
+
+    @property
+    def weight(self):
+        own = self.size if self.body is not None else 0
+        return own + sum(v.weight for v in self.variants.values() if v is not self)
+
+    @property
+    def descriptors(self):
+        own = self.fd is not None
+        return own + sum(v.descriptors for v in self.variants.values() if v is not self)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        for variant in self.variants.values():
+            if variant is not self:
+                variant.close()
+
+
+def file_signature(path):
+    try:
+        st = os.stat(path)
+    except (OSError, ValueError):
+        # ValueError: an embedded NUL byte, e.g. from a request for /index%00.html
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+class FileCache:
+    """
+    LRU cache of DOCUMENT_ROOT files bounded by the bytes of cached bodies and by the
+    number of open descriptors. An entry is revalidated with stat() at most once per
+    check_interval and reloaded when size, mtime or inode of the file or of one of its
+    precompressed siblings change, so a hot file is served without touching the file
+    system in between.
+    """
+
+    def __init__(self, render_head, max_bytes=MAX_BYTES, max_file_size=MAX_FILE_SIZE,
+                 max_open_files=MAX_OPEN_FILES, check_interval=CHECK_INTERVAL,
+                 siblings=SIBLINGS, clock=time.monotonic):
+        self.render_head = render_head
+        self.max_bytes = max_bytes
+        self.max_file_size = min(max_file_size, max_bytes)
+        self.max_open_files = max_open_files
+        self.check_interval = check_interval
+        self.siblings = siblings
+        self.clock = clock
+        self.bytes = 0
+        self.open_files = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def peek(self, path):
+        """Entry that needs no revalidation, None otherwise; never blocks on the file system"""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or self.clock() - entry.checked_at >= self.check_interval:
+                return None
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return entry
+
+    def get(self, path):
+        """Entry for the path, None if it is not a regular file"""
+        entry = self.peek(path)
+        if entry is not None:
+            return entry
+        with self._lock:
+            entry = self._entries.get(path)
+        signature = self._signature(path)
+        if signature[0] is None:
+            self.discard(path)
+            return None
+        if entry is not None and entry.signature == signature:
+            entry.checked_at = self.clock()
+            return entry
+        try:
+            entry = self._load(path, signature)
+        except OSError:
+            self.discard(path)
+            return None
+        with self._lock:
+            self.misses += 1
+            self._remove(path)
+            self._entries[path] = entry
+            self.bytes += entry.weight
+            self.open_files += entry.descriptors
+            self._evict()
+        return entry
+
+    def _signature(self, path):
+        return (file_signature(path),) + tuple(
+            file_signature(path + suffix) for _, suffix in self.siblings
+        )
+
+    def _load(self, path, signature):
+        entry = self._load_file(path)
+        try:
+            for (encoding, suffix), sibling in zip(self.siblings, signature[1:]):
+                if sibling is not None:
+                    entry.variants[encoding] = self._load_file(path + suffix, encoding)
+        except BaseException:
+            entry.close()
+            raise
+        # the file itself last: its head may depend on the variants
+        for variant in entry.variants.values():
+            self._render(variant)
+        self._render(entry)
+        entry.signature = signature
+        entry.checked_at = self.clock()
+        return entry
+
+    def _load_file(self, path, encoding=None):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            # Metadata and contents come from the same descriptor
+            st = os.fstat(fd)
+            if st.st_size > self.max_file_size:
+                entry = CachedFile(path, st.st_size, st.st_mtime_ns, st.st_ino, fd=fd,
+                                   encoding=encoding)
+                fd = None
+            else:
+                with os.fdopen(os.dup(fd), 'rb') as file:
+                    body = file.read(st.st_size)
+                # a file truncated while being read is served as read, the next check reloads it
+                entry = CachedFile(path, len(body), st.st_mtime_ns, st.st_ino, body=body,
+                                   encoding=encoding)
+        finally:
+            if fd is not None:
+                os.close(fd)
+        return entry
+
+    def _render(self, entry):
+        entry.head = self.render_head(entry)
+        if entry.body is not None:
+            entry.response = entry.head + entry.body
+            entry.body = memoryview(entry.response)[len(entry.head):]
+
+    def add_variant(self, entry, encoding, body):
+        """
+        Attaches a representation made in memory, e.g. gzip of a small text file; a body
+        that is None records that the coding does not pay off and the file is sent as is
+        """
+        if body is None:
+            variant = entry
+        else:
+            # not a real file, only the suffix matters
+            variant = CachedFile(f'{entry.path}.{encoding}', len(body), entry.mtime_ns,
+                                 entry.inode, body=body, encoding=encoding)
+            variant.etag = f'{entry.etag[:-1]}-{encoding}"'
+            self._render(variant)
+        with self._lock:
+            if encoding in entry.variants:
+                return entry.variants[encoding]
+            entry.variants[encoding] = variant
+            if self._entries.get(entry.path) is entry and variant is not entry:
+                self.bytes += variant.weight
+                self._evict()
+        return variant
+
+    def open(self, entry):
+        """
+        File object of a large file for one response. It owns a duplicate of the cached
+        descriptor, so eviction does not close it under a running sendfile; positions are
+        passed to sendfile explicitly, the shared offset is never used
+        """
+        with self._lock:
+            if entry.fd is not None:
+                return os.fdopen(os.dup(entry.fd), 'rb')
+        # evicted in the meantime
+        return open(entry.path, 'rb')
+
+    def discard(self, path):
+        with self._lock:
+            self._remove(path)
+
+    def clear(self):
+        with self._lock:
+            for path in list(self._entries):
+                self._remove(path)
+
+    def _remove(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.bytes -= entry.weight
+            self.open_files -= entry.descriptors
+            entry.close()
+
+    def _evict(self):
+        while self._entries and (self.bytes > self.max_bytes
+                                 or self.open_files > self.max_open_files):
+            self._remove(next(iter(self._entries)))
+
+    def __len__(self):
+        return len(self._entries)
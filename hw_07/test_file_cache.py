@@ -0,0 +1,134 @@
+# usage: pytest test_file_cache.py
+
+import os
+
+import pytest
+
+from file_cache import FileCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def render_head(entry):
+    return f'{entry.size}\n\n'.encode()
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def cache(clock):
+    cache = FileCache(render_head, max_bytes=100, max_file_size=10, max_open_files=2,
+                      check_interval=1.0, clock=clock)
+    yield cache
+    cache.clear()
+
+
+def write(path, content):
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_small_file_served_from_memory(cache, tmp_path, monkeypatch):
+    path = write(tmp_path / 'a.txt', b'hello')
+    entry = cache.get(path)
+    assert entry.response == b'5\n\nhello'
+    assert bytes(entry.body) == b'hello'
+    assert entry.fd is None
+
+    def fail(*args):
+        raise AssertionError('file system touched')
+
+    monkeypatch.setattr(os, 'stat', fail)
+    monkeypatch.setattr(os, 'open', fail)
+    assert cache.peek(path) is entry
+    assert cache.get(path) is entry
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_revalidated_after_check_interval(cache, clock, tmp_path):
+    path = write(tmp_path / 'a.txt', b'old')
+    entry = cache.get(path)
+    clock.now = 1.0
+    assert cache.peek(path) is None
+    assert cache.get(path) is entry
+    write(tmp_path / 'a.txt', b'newer')
+    assert cache.get(path) is entry
+    clock.now = 2.0
+    assert cache.get(path).response == b'5\n\nnewer'
+    os.remove(path)
+    clock.now = 3.0
+    assert cache.get(path) is None
+    assert len(cache) == 0
+
+
+def test_missing_and_directories(cache, tmp_path):
+    assert cache.get(str(tmp_path / 'missing')) is None
+    assert cache.get(str(tmp_path)) is None
+    assert cache.get(str(tmp_path / 'a\0.txt')) is None
+
+
+def test_large_file_keeps_descriptor(cache, tmp_path):
+    path = write(tmp_path / 'big.bin', b'x' * 50)
+    entry = cache.get(path)
+    assert entry.response is None
+    assert entry.head == b'50\n\n'
+    with cache.open(entry) as file:
+        assert file.fileno() != entry.fd
+        assert os.pread(file.fileno(), 50, 0) == b'x' * 50
+    assert cache.open_files == 1
+
+
+def test_eviction_bounds_bytes_and_descriptors(cache, tmp_path):
+    small = [write(tmp_path / f's{i}', b'y' * 10) for i in range(12)]
+    for path in small:
+        cache.get(path)
+    assert cache.bytes == 100
+    assert cache.peek(small[0]) is None
+    assert cache.peek(small[-1]) is not None
+
+    large = [write(tmp_path / f'l{i}', b'z' * 20) for i in range(3)]
+    entries = [cache.get(path) for path in large]
+    assert cache.open_files == 2
+    assert entries[0].fd is None
+    # an evicted large file is still served
+    with cache.open(entries[0]) as file:
+        assert file.read() == b'z' * 20
+
+
+def test_siblings_and_variants(cache, clock, tmp_path):
+    path = write(tmp_path / 'a.html', b'a' * 8)
+    write(tmp_path / 'a.html.gz', b'gz')
+    entry = cache.get(path)
+    assert set(entry.variants) == {'gzip'}
+    assert entry.variants['gzip'].response == b'2\n\ngz'
+    assert entry.variants['gzip'].encoding == 'gzip'
+    assert cache.bytes == 10
+
+    write(tmp_path / 'a.html.br', b'br!')
+    clock.now = 1.0
+    entry = cache.get(path)
+    assert set(entry.variants) == {'br', 'gzip'}
+    assert cache.bytes == 13
+
+
+def test_add_variant(cache, tmp_path):
+    path = write(tmp_path / 'a.html', b'a' * 8)
+    entry = cache.get(path)
+    variant = cache.add_variant(entry, 'gzip', b'zz')
+    assert variant.encoding == 'gzip'
+    assert variant.etag == entry.etag[:-1] + '-gzip"'
+    assert cache.add_variant(entry, 'gzip', b'other') is variant
+    assert cache.bytes == 10
+    assert cache.add_variant(entry, 'br', None) is entry
+    assert cache.bytes == 10
+    cache.discard(path)
+    assert cache.bytes == 0
@@ -3,23 +3,49 @@
 # ab -n 1000 -c 5 http://127.0.0.1:8090/index.html
 # wrk -t12 -c400 -d30s http://localhost:8090/index.html
 
+import email
+import gzip
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+
 import pytest
 import requests
 import threading
 import time
 
-from web_srv import start_server, HOST, PORT
+import web_srv
+from web_srv import start_server, send_response, HOST, PORT
+
+THREADS_PORT = PORT + 1
+WORKERS_PORT = PORT + 2
 
 
 @pytest.fixture(scope='module')
 def server():
-    server_thread = threading.Thread(target=start_server)
+    server_thread = threading.Thread(target=start_server, daemon=True)
     server_thread.start()
     time.sleep(1)  # start delay
+    # a dead thread means the port is taken, the tests would talk to another server
+    assert server_thread.is_alive(), f'port {PORT} is busy'
     yield
     # no need to stop the server as pytest will terminate the process
 
 
+@pytest.fixture(scope='module')
+def threads_server():
+    server_thread = threading.Thread(
+        target=start_server, kwargs={'port': THREADS_PORT, 'engine': 'threads'}, daemon=True
+    )
+    server_thread.start()
+    time.sleep(1)
+    assert server_thread.is_alive(), f'port {THREADS_PORT} is busy'
+    yield
+
+
 def test_index_page(server):
     response = requests.get(f'http://{HOST}:{PORT}/')
     assert response.status_code == 200
@@ -30,3 +56,347 @@ def test_not_found_page(server):
     response = requests.get(f'http://{HOST}:{PORT}/noexist_page.html')
     assert response.status_code == 404
     assert 'File Not Found' in response.text
+
+
+def test_null_byte_in_path(server):
+    response = requests.get(f'http://{HOST}:{PORT}/index%00.html')
+    assert response.status_code == 404
+
+
+def test_head(server):
+    response = requests.head(f'http://{HOST}:{PORT}/index.html')
+    assert response.status_code == 200
+    assert int(response.headers['Content-Length']) > 0
+    assert response.content == b''
+
+
+def test_outside_document_root(server):
+    with socket.create_connection((HOST, PORT)) as sock:
+        sock.sendall(b'GET /../web_srv.py HTTP/1.1\r\n\r\n')
+        assert sock.recv(1024).startswith(b'HTTP/1.1 404')
+
+
+def test_many_idle_connections(server):
+    clients = [socket.create_connection((HOST, PORT)) for _ in range(1000)]
+    try:
+        response = requests.get(f'http://{HOST}:{PORT}/index.html', timeout=5)
+        assert response.status_code == 200
+    finally:
+        for client in clients:
+            client.close()
+
+
+def test_threads_engine(threads_server):
+    response = requests.get(f'http://{HOST}:{THREADS_PORT}/')
+    assert response.status_code == 200
+    assert 'index.html' in response.text
+
+
+def test_large_file(server, tmp_path, monkeypatch):
+    content = os.urandom(8 * 1024 * 1024)
+    (tmp_path / 'big.bin').write_bytes(content)
+    monkeypatch.setattr(web_srv, 'DOCUMENT_ROOT', str(tmp_path))
+    response = requests.get(f'http://{HOST}:{PORT}/big.bin')
+    assert response.status_code == 200
+    assert int(response.headers['Content-Length']) == len(content)
+    assert response.content == content
+
+
+def test_send_response_uses_sendfile(tmp_path, monkeypatch):
+    (tmp_path / 'file.txt').write_bytes(b'body')
+    calls = []
+    monkeypatch.setattr(socket.socket, 'sendfile', lambda self, file, offset: calls.append(file.name))
+    left, right = socket.socketpair()
+    with left, right:
+        send_response(left, b'head\n\n', open(tmp_path / 'file.txt', 'rb'))
+        assert right.recv(1024) == b'head\n\n'
+    assert calls == [str(tmp_path / 'file.txt')]
+
+
+def get(conn, path='/', headers=None):
+    conn.request('GET', path, headers=headers or {})
+    response = conn.getresponse()
+    return response, response.read()
+
+
+@pytest.mark.parametrize('port', [PORT, THREADS_PORT])
+def test_keep_alive(server, threads_server, port):
+    conn = http.client.HTTPConnection(HOST, port)
+    response, body = get(conn)
+    assert response.status == 200
+    assert not response.will_close
+    sock = conn.sock
+    for _ in range(3):
+        response, _ = get(conn, '/index.html')
+        assert response.status == 200
+        assert conn.sock is sock
+    response, _ = get(conn, '/noexist_page.html')
+    assert response.status == 404
+    assert conn.sock is sock
+    response, _ = get(conn, '/', {'Connection': 'close'})
+    assert response.will_close
+    conn.close()
+
+
+def test_pipelined_requests(server):
+    with socket.create_connection((HOST, PORT)) as sock:
+        sock.sendall(b'HEAD / HTTP/1.1\r\nHost: x\r\n\r\n' * 2 + b'GET / HTTP/1.0\r\n\r\n')
+        data = b''
+        while chunk := sock.recv(65536):
+            data += chunk
+    assert data.count(b'HTTP/1.1 200 OK') == 3
+    assert data.endswith(b'</html>')
+
+
+def test_http10_closes_by_default(server):
+    with socket.create_connection((HOST, PORT)) as sock:
+        sock.sendall(b'GET / HTTP/1.0\r\n\r\n')
+        sock.settimeout(5)
+        data = b''
+        while chunk := sock.recv(65536):
+            data += chunk
+    assert b'Connection: close' in data
+
+
+def test_idle_connection_closed(server, monkeypatch):
+    monkeypatch.setattr(web_srv, 'KEEPALIVE_TIMEOUT', 0.2)
+    with socket.create_connection((HOST, PORT)) as sock:
+        sock.settimeout(5)
+        assert sock.recv(1024) == b''
+
+
+def test_conditional_get(server):
+    conn = http.client.HTTPConnection(HOST, PORT)
+    response, body = get(conn)
+    etag = response.getheader('ETag')
+    last_modified = response.getheader('Last-Modified')
+    assert response.getheader('Content-Type') == 'text/html'
+    assert etag and last_modified
+    response, body = get(conn, '/', {'If-None-Match': f'W/"x", {etag}'})
+    assert response.status == 304
+    assert body == b''
+    assert response.getheader('ETag') == etag
+    response, _ = get(conn, '/', {'If-None-Match': '"other"', 'If-Modified-Since': last_modified})
+    assert response.status == 200
+    response, _ = get(conn, '/', {'If-Modified-Since': last_modified})
+    assert response.status == 304
+    response, _ = get(conn, '/', {'If-Modified-Since': 'Thu, 01 Jan 1970 00:00:00 GMT'})
+    assert response.status == 200
+    conn.close()
+
+
+def test_large_headers(server):
+    conn = http.client.HTTPConnection(HOST, PORT)
+    response, _ = get(conn, '/', {'Cookie': 'x' * 32 * 1024})
+    assert response.status == 200
+    response, _ = get(conn, '/', {'Cookie': 'x' * 128 * 1024})
+    assert response.status == 431
+    conn.close()
+
+
+def test_bad_requests(server):
+    conn = http.client.HTTPConnection(HOST, PORT)
+    conn.request('POST', '/', body=b'data')
+    response = conn.getresponse()
+    assert response.status == 405
+    assert response.getheader('Allow') == 'GET, HEAD'
+    conn.close()
+    with socket.create_connection((HOST, PORT)) as sock:
+        sock.sendall(b'garbage\r\n\r\n')
+        assert sock.recv(1024).startswith(b'HTTP/1.1 400 Bad Request')
+
+
+@pytest.fixture
+def assets(tmp_path, monkeypatch):
+    monkeypatch.setattr(web_srv, 'DOCUMENT_ROOT', str(tmp_path))
+    script = b'function hello() { return "hello"; }\n' * 20
+    (tmp_path / 'app.js').write_bytes(script)
+    (tmp_path / 'app.js.gz').write_bytes(gzip.compress(script))
+    (tmp_path / 'app.js.br').write_bytes(b'brotli bytes')
+    (tmp_path / 'style.css').write_bytes(b'body { margin: 0; }\n' * 50)
+    (tmp_path / 'tiny.txt').write_bytes(b'tiny')
+    return tmp_path
+
+
+def test_gzip_on_the_fly(server, assets):
+    conn = http.client.HTTPConnection(HOST, PORT)
+    for _ in range(2):
+        response, body = get(conn, '/style.css', {'Accept-Encoding': 'gzip, deflate'})
+        assert response.getheader('Content-Encoding') == 'gzip'
+        assert response.getheader('Content-Type') == 'text/css'
+        assert response.getheader('Vary') == 'Accept-Encoding'
+        assert gzip.decompress(body) == (assets / 'style.css').read_bytes()
+    response, body = get(conn, '/style.css', {'Accept-Encoding': 'gzip;q=0'})
+    assert response.getheader('Content-Encoding') is None
+    assert body == (assets / 'style.css').read_bytes()
+    response, body = get(conn, '/tiny.txt', {'Accept-Encoding': 'gzip'})
+    assert response.getheader('Content-Encoding') is None
+    assert body == b'tiny'
+    conn.close()
+
+
+def test_precompressed_siblings(server, assets):
+    conn = http.client.HTTPConnection(HOST, PORT)
+    response, body = get(conn, '/app.js', {'Accept-Encoding': 'gzip, br'})
+    assert response.getheader('Content-Encoding') == 'br'
+    assert 'javascript' in response.getheader('Content-Type')
+    assert body == b'brotli bytes'
+    response, body = get(conn, '/app.js', {'Accept-Encoding': 'gzip'})
+    assert response.getheader('Content-Encoding') == 'gzip'
+    assert body == (assets / 'app.js.gz').read_bytes()
+    etag = response.getheader('ETag')
+    response, _ = get(conn, '/app.js', {'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status == 304
+    response, body = get(conn, '/app.js')
+    assert response.getheader('Content-Encoding') is None
+    assert response.getheader('Vary') == 'Accept-Encoding'
+    assert body == (assets / 'app.js').read_bytes()
+    response, body = get(conn, '/app.js.gz', {'Accept-Encoding': 'gzip'})
+    assert response.getheader('Content-Encoding') is None
+    assert response.getheader('Content-Type') == 'application/octet-stream'
+    conn.close()
+
+
+def test_accepted_encodings():
+    assert web_srv.accepted_encodings('gzip, deflate, br') == {'gzip', 'deflate', 'br'}
+    assert web_srv.accepted_encodings('br;q=0, gzip;q=0.5') == {'gzip'}
+    assert web_srv.accepted_encodings('*') == {'*', 'br', 'gzip'}
+    assert web_srv.accepted_encodings('') == set()
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return {int(child) for child in f.read().split()}
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.1)
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/task'), reason='needs procfs')
+def test_workers():
+    master = subprocess.Popen(
+        [sys.executable, 'web_srv.py', '--workers', '2', '--port', str(WORKERS_PORT)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_for(lambda: len(children(master.pid)) == 2)
+        workers = children(master.pid)
+        for _ in range(10):
+            # a new connection each time, the kernel picks the worker
+            response = requests.get(f'http://{HOST}:{WORKERS_PORT}/', timeout=5)
+            assert response.status_code == 200
+        os.kill(workers.pop(), signal.SIGKILL)
+        wait_for(lambda: len(children(master.pid)) == 2 and workers < children(master.pid))
+        response = requests.get(f'http://{HOST}:{WORKERS_PORT}/', timeout=5)
+        assert response.status_code == 200
+        survivors = children(master.pid)
+    finally:
+        master.terminate()
+        assert master.wait(10) == 0
+    for pid in survivors:
+        assert not os.path.exists(f'/proc/{pid}')
+
+
+def test_parse_ranges():
+    assert web_srv.parse_ranges('bytes=0-9', 100) == [(0, 10)]
+    assert web_srv.parse_ranges('bytes=90-', 100) == [(90, 10)]
+    assert web_srv.parse_ranges('bytes=-10', 100) == [(90, 10)]
+    assert web_srv.parse_ranges('bytes=-200, 95-1000', 100) == [(0, 100)]
+    assert web_srv.parse_ranges('bytes=50-59, 0-9, 5-14, 15-19', 100) == [(0, 20), (50, 10)]
+    assert web_srv.parse_ranges('bytes=100-, -0', 100) == []
+    for header in ('bytes=9-0', 'bytes=-', 'bytes=a-b', 'items=0-9', 'bytes 0-9',
+                   'bytes=' + ','.join(['0-0'] * 17), 'bytes=0-' + '9' * 5000,
+                   'bytes=-' + '9' * 19):
+        assert web_srv.parse_ranges(header, 100) is None
+
+
+@pytest.fixture
+def media(tmp_path, monkeypatch):
+    monkeypatch.setattr(web_srv, 'DOCUMENT_ROOT', str(tmp_path))
+    content = os.urandom(1024 * 1024)
+    (tmp_path / 'video.mp4').write_bytes(content)
+    (tmp_path / 'small.txt').write_bytes(b'0123456789' * 10)
+    return tmp_path
+
+
+@pytest.mark.parametrize('port', [PORT, THREADS_PORT])
+@pytest.mark.parametrize('name', ['video.mp4', 'small.txt'])
+def test_single_range(server, threads_server, media, port, name):
+    content = (media / name).read_bytes()
+    conn = http.client.HTTPConnection(HOST, port)
+    response, body = get(conn, f'/{name}')
+    assert response.getheader('Accept-Ranges') == 'bytes'
+    etag = response.getheader('ETag')
+    response, body = get(conn, f'/{name}', {'Range': 'bytes=10-49'})
+    assert response.status == 206
+    assert response.getheader('Content-Range') == f'bytes 10-49/{len(content)}'
+    assert body == content[10:50]
+    response, body = get(conn, f'/{name}', {'Range': 'bytes=-5', 'If-Range': etag})
+    assert response.status == 206
+    assert body == content[-5:]
+    # the connection is still in sync after partial bodies
+    response, body = get(conn, f'/{name}', {'Range': 'bytes=0-4', 'If-Range': '"stale"'})
+    assert response.status == 200
+    assert body == content
+    response, body = get(conn, f'/{name}', {'Range': 'bytes=0-' + '9' * 5000})
+    assert response.status == 200
+    assert body == content
+    response, body = get(conn, f'/{name}', {'Range': f'bytes={len(content)}-'})
+    assert response.status == 416
+    assert response.getheader('Content-Range') == f'bytes */{len(content)}'
+    assert body == b''
+    conn.close()
+
+
+@pytest.mark.parametrize('name', ['video.mp4', 'small.txt'])
+def test_multiple_ranges(server, media, name):
+    content = (media / name).read_bytes()
+    response = requests.get(f'http://{HOST}:{PORT}/{name}',
+                            headers={'Range': 'bytes=0-9, 50-59, -3'})
+    assert response.status_code == 206
+    message = email.message_from_bytes(
+        b'Content-Type: ' + response.headers['Content-Type'].encode() + b'\r\n\r\n'
+        + response.content
+    )
+    assert message.get_content_type() == 'multipart/byteranges'
+    parts = message.get_payload()
+    assert [part['Content-Range'] for part in parts] == [
+        f'bytes 0-9/{len(content)}', f'bytes 50-59/{len(content)}',
+        f'bytes {len(content) - 3}-{len(content) - 1}/{len(content)}',
+    ]
+    assert [part.get_payload(decode=True) for part in parts] == [
+        content[:10], content[50:60], content[-3:],
+    ]
+
+
+def test_worker_failure_is_reported():
+    code = 'import socket, web_srv; web_srv.run_workers([socket.socket()], lambda sock: 1 / 0)'
+    master = subprocess.Popen([sys.executable, '-c', code], stderr=subprocess.PIPE,
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+    time.sleep(0.5)
+    master.terminate()
+    _, errors = master.communicate(timeout=10)
+    assert b'failed:' in errors
+    assert b'ZeroDivisionError' in errors
+
+
+def test_stop_after_worker_reaped():
+    # SIGTERM arrives after os.wait() reaped a worker, before the master forgets it
+    code = '\n'.join([
+        'import os, signal, socket, web_srv',
+        'wait = os.wait',
+        'def reap():',
+        '    result = wait()',
+        '    os.kill(os.getpid(), signal.SIGTERM)',
+        '    return result',
+        'os.wait = reap',
+        'web_srv.run_workers([socket.socket()] * 2, lambda sock: os._exit(0))',
+    ])
+    master = subprocess.Popen([sys.executable, '-c', code], stderr=subprocess.PIPE,
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+    _, errors = master.communicate(timeout=10)
+    assert master.returncode == 0, errors
@@ -1,55 +1,664 @@
+import argparse
+import asyncio
+import gzip
+import mimetypes
+import os
+import re
+import resource
+import signal
 import socket
+import sys
 import threading
-import os
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import unquote, urlsplit
+
+from file_cache import FileCache
 
 HOST = '127.0.0.1'
 PORT = 8090
 
 DOCUMENT_ROOT = './www'  # root folder for static files
 
+BACKLOG = 1024  # pending connections queued by the kernel
+POOL_SIZE = 32  # threads doing blocking file system work for the event loop
+WORKERS = 1  # processes, each running its own accept loop
+RESPAWN_DELAY = 1.0  # seconds to wait before restarting a worker that died right away
+STOP_SIGNALS = {signal.SIGTERM, signal.SIGINT}
+ENGINES = ('async', 'threads')
 
-def handle_request(client_socket):
+MAX_HEAD_SIZE = 64 * 1024  # request line and headers, larger requests get 431
+KEEPALIVE_TIMEOUT = 15  # seconds a connection may stay idle between requests
+MAX_KEEPALIVE_REQUESTS = 1000  # requests per connection before it is closed
+
+METHODS = ('GET', 'HEAD')
+
+# Content codings in the order of preference; br only from precompressed .br files,
+# gzip also made on the fly for small text files
+ENCODINGS = ('br', 'gzip')
+GZIP_LEVEL = 6
+MIN_COMPRESS_SIZE = 128  # bytes, smaller bodies do not win anything
+COMPRESSIBLE_TYPES = {
+    'application/javascript', 'application/json', 'application/xml', 'image/svg+xml',
+}
+MAX_RANGES = 16  # byte ranges per request, a longer Range header is ignored
+# 18 digits fit any file size; longer bounds would only feed int() huge strings
+RANGE_SPEC = re.compile(r'(\d{0,18})-(\d{0,18})', re.ASCII)
+
+STATUSES = {
+    200: 'OK',
+    206: 'Partial Content',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    416: 'Range Not Satisfiable',
+    431: 'Request Header Fields Too Large',
+}
+
+
+class BadRequest(ValueError):
+    def __init__(self, status=400):
+        super().__init__(STATUSES[status])
+        self.status = status
+
+
+class Request:
+    __slots__ = ('method', 'path', 'version', 'headers')
+
+    def __init__(self, method, path, version, headers):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+    @property
+    def has_body(self):
+        headers = self.headers
+        return 'transfer-encoding' in headers or headers.get('content-length', '0') != '0'
+
+
+def parse_request(head):
+    """Request from the bytes before the blank line, raises BadRequest"""
     try:
-        request = client_socket.recv(1024).decode()
-        headers = request.split('\n')
-        method, path, _ = headers[0].split(' ')
+        lines = head.decode('latin-1').split('\r\n')
+        method, target, version = lines[0].split(' ')
+    except ValueError:
+        raise BadRequest() from None
+    if not version.startswith('HTTP/1.'):
+        raise BadRequest()
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(':')
+        if not sep:
+            raise BadRequest()
+        headers[name.strip().lower()] = value.strip()
+    return Request(method, unquote(urlsplit(target).path), version, headers)
+
+
+def resolve_path(path):
+    """
+    Path under DOCUMENT_ROOT for the request path, None if it points outside;
+    string operations only, existence is checked by the file cache
+    """
+    if path == '/':
+        path = '/index.html'
+    root = os.path.abspath(DOCUMENT_ROOT)
+    file_path = os.path.abspath(os.path.join(root, path.lstrip('/')))
+    if not file_path.startswith(root + os.sep):
+        return None
+    return file_path
+
+
+def content_type(entry):
+    """Type of the file a representation was made from; a .gz requested as is is opaque"""
+    path = entry.path.rsplit('.', 1)[0] if entry.encoding else entry.path
+    guessed, encoding = mimetypes.guess_type(path)
+    if encoding is not None or guessed is None:
+        return 'application/octet-stream'
+    return guessed
+
+
+def compressible(entry):
+    if entry.encoding or entry.body is None or entry.size < MIN_COMPRESS_SIZE:
+        return False
+    type_ = content_type(entry)
+    return type_.startswith('text/') or type_ in COMPRESSIBLE_TYPES
+
+
+def render_head(entry, status=200, fields=None):
+    """
+    Head of a response about the entry; fields frame the body of a 206 or 416 in place
+    of Content-Type and Content-Length of the whole representation
+    """
+    lines = [f'HTTP/1.1 {status} {STATUSES[status]}']
+    if status == 200:
+        fields = [f'Content-Type: {content_type(entry)}', f'Content-Length: {entry.size}']
+    if fields is not None:
+        lines += fields
+        lines.append('Accept-Ranges: bytes')
+        if entry.encoding:
+            lines.append(f'Content-Encoding: {entry.encoding}')
+    if entry.encoding or entry.variants or compressible(entry):
+        lines.append('Vary: Accept-Encoding')
+    lines += [
+        f'ETag: {entry.etag}',
+        f'Last-Modified: {formatdate(entry.mtime, usegmt=True)}',
+        '', '',
+    ]
+    return '\r\n'.join(lines).encode()
+
+
+def error_head(status, content_length=0, extra=''):
+    return (f'HTTP/1.1 {status} {STATUSES[status]}\r\n{extra}'
+            f'Content-Length: {content_length}\r\n\r\n').encode()
+
+
+NOT_FOUND_BODY = b'File Not Found'
+NOT_FOUND = error_head(404, len(NOT_FOUND_BODY))
+NOT_ALLOWED = error_head(405, extra='Allow: GET, HEAD\r\n')
+
+file_cache = FileCache(render_head)
+
+
+def not_modified(request, entry):
+    """Conditional GET: If-None-Match wins over If-Modified-Since"""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return '*' in tags or entry.etag in tags
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(entry.mtime) <= since
+
+
+def accepted_encodings(header):
+    """Codings of Accept-Encoding with a non-zero q"""
+    accepted = set()
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        q = params.strip().removeprefix('q=') if params else '1'
+        try:
+            if coding and float(q) > 0:
+                accepted.add(coding)
+        except ValueError:
+            continue
+    if '*' in accepted:
+        accepted.update(ENCODINGS)
+    return accepted
+
+
+def needs_compression(request, entry):
+    """gzip is accepted but has not been tried for this file yet"""
+    return ('gzip' not in entry.variants and compressible(entry)
+            and 'gzip' in accepted_encodings(request.headers.get('accept-encoding', '')))
+
+
+def compress(entry):
+    """Makes the gzip variant of a small text file, blocks for the compression"""
+    body = gzip.compress(entry.body, GZIP_LEVEL, mtime=0)
+    return file_cache.add_variant(entry, 'gzip', body if len(body) < entry.size else None)
+
+
+def negotiate(request, entry):
+    """Representation for Accept-Encoding: a precompressed or compressed variant, or the file"""
+    if entry is None or not entry.variants:
+        return entry
+    accepted = accepted_encodings(request.headers.get('accept-encoding', ''))
+    for encoding in ENCODINGS:
+        if encoding in accepted and encoding in entry.variants:
+            return entry.variants[encoding]
+    return entry
+
+
+def parse_ranges(header, size):
+    """
+    (offset, count) pairs of a bytes Range header, sorted, overlapping and adjacent ranges
+    merged; None for a header to ignore, an empty list if no range is satisfiable
+    """
+    unit, sep, specs = header.partition('=')
+    specs = specs.split(',')
+    if not sep or unit.strip().lower() != 'bytes' or len(specs) > MAX_RANGES:
+        return None
+    ranges = []
+    for spec in specs:
+        match = RANGE_SPEC.fullmatch(spec.strip())
+        if match is None or match.group(0) == '-':
+            return None
+        first, last = match.groups()
+        if not first:
+            # suffix range: the last N bytes
+            start, end = max(size - int(last), 0), size
+        else:
+            start, end = int(first), int(last) + 1 if last else size
+            if last and end <= start:
+                return None
+        end = min(end, size)
+        if start < end:
+            ranges.append([start, end])
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end - start) for start, end in merged]
+
+
+def requested_ranges(request, entry):
+    """
+    Ranges of a GET that apply to the entry: If-Range has to name the representation
+    the client already has a part of, otherwise the whole one is sent
+    """
+    header = request.headers.get('range')
+    if header is None or request.method != 'GET':
+        return None
+    if_range = request.headers.get('if-range')
+    if if_range is not None and if_range not in (entry.etag,
+                                                 formatdate(entry.mtime, usegmt=True)):
+        return None
+    return parse_ranges(header, entry.size)
+
+
+class FileRanges:
+    """Body of a 206 of a large file: (offset, count) ranges to sendfile and framing bytes"""
+
+    __slots__ = ('file', 'parts')
+
+    def __init__(self, file, parts):
+        self.file = file
+        self.parts = parts
+
 
-        if method in ['GET', 'HEAD']:
-            if path == '/':
-                path = '/index.html'
+def partial_content(entry, ranges):
+    """Head fields and parts of a 206, multipart/byteranges for several ranges"""
+    size = entry.size
+    type_ = content_type(entry)
+    if len(ranges) == 1:
+        (offset, count), = ranges
+        fields = [f'Content-Type: {type_}',
+                  f'Content-Range: bytes {offset}-{offset + count - 1}/{size}',
+                  f'Content-Length: {count}']
+        return fields, ranges
+    boundary = uuid.uuid4().hex
+    parts = []
+    for offset, count in ranges:
+        parts.append(f'\r\n--{boundary}\r\nContent-Type: {type_}\r\n'
+                     f'Content-Range: bytes {offset}-{offset + count - 1}/{size}\r\n\r\n'.encode())
+        parts.append((offset, count))
+    parts.append(f'\r\n--{boundary}--\r\n'.encode())
+    length = sum(part[1] if isinstance(part, tuple) else len(part) for part in parts)
+    fields = [f'Content-Type: multipart/byteranges; boundary={boundary}',
+              f'Content-Length: {length}']
+    return fields, parts
 
-            file_path = os.path.join(DOCUMENT_ROOT, path[1:])
 
-            if os.path.exists(file_path):
-                with open(file_path, 'rb') as file:
-                    content = file.read()
+def build_partial(request, entry, ranges, keep_alive):
+    if not ranges:
+        head = render_head(entry, 416, [f'Content-Range: bytes */{entry.size}',
+                                        'Content-Length: 0'])
+        return with_connection(head, request, keep_alive), None
+    fields, parts = partial_content(entry, ranges)
+    head = with_connection(render_head(entry, 206, fields), request, keep_alive)
+    if entry.body is None:
+        return head, FileRanges(file_cache.open(entry), parts)
+    # slices of a cached body are views, a single range is sent without a copy
+    chunks = [entry.body[part[0]:part[0] + part[1]] if isinstance(part, tuple) else part
+              for part in parts]
+    return head, chunks[0] if len(chunks) == 1 else b''.join(chunks)
 
-                response = f'HTTP/1.1 200 OK\nContent-Length: {len(content)}\n\n'
 
-                if method == 'GET':
-                    response = response.encode() + content
-                else:  # HEAD
-                    response = response.encode()
-            else:
-                response = 'HTTP/1.1 404 Not Found\n\nFile Not Found'.encode()
+def with_connection(head, request, keep_alive):
+    """Connection header for HTTP/1.0 keep-alive and for connections about to close"""
+    if not keep_alive:
+        return head[:-2] + b'Connection: close\r\n\r\n'
+    if request.version == 'HTTP/1.0':
+        return head[:-2] + b'Connection: keep-alive\r\n\r\n'
+    return head
 
-            client_socket.sendall(response)
+
+def build_response(request, entry, keep_alive=True):
+    """
+    Response head and body for a cached file (None if there is no file). The body is
+    None, bytes, an open file to send with sendfile, or FileRanges of one
+    """
+    if request.method not in METHODS:
+        return with_connection(NOT_ALLOWED, request, keep_alive), None
+    if entry is None:
+        return with_connection(NOT_FOUND, request, keep_alive), NOT_FOUND_BODY
+    if not_modified(request, entry):
+        return with_connection(render_head(entry, 304), request, keep_alive), None
+    head = with_connection(entry.head, request, keep_alive)
+    if request.method == 'HEAD':
+        return head, None
+    ranges = requested_ranges(request, entry)
+    if ranges is not None:
+        return build_partial(request, entry, ranges, keep_alive)
+    if entry.response is not None:
+        if head is entry.head:
+            # head and body in one pre-built buffer
+            return entry.response, None
+        return head, entry.body
+    return head, file_cache.open(entry)
+
+
+def make_response(request, keep_alive=True):
+    file_path = resolve_path(request.path) if request.method in METHODS else None
+    entry = file_cache.get(file_path) if file_path else None
+    if entry is not None and needs_compression(request, entry):
+        compress(entry)
+    return build_response(request, negotiate(request, entry), keep_alive)
+
+
+def keeps_alive(request, handled):
+    return request.keep_alive and not request.has_body and handled < MAX_KEEPALIVE_REQUESTS
+
+
+@contextmanager
+def corked(sock):
+    """
+    Holds partial frames while the head and the body are written separately, so the
+    body does not wait for the ACK of the head (Nagle + delayed ACK)
+    """
+    tcp = sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6)
+    if not tcp or not hasattr(socket, 'TCP_CORK'):
+        yield
+        return
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 1)
+    try:
+        yield
+    finally:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 0)
+
+
+def send_response(client_socket, head, body):
+    with corked(client_socket):
+        client_socket.sendall(head)
+        if body is None:
+            return
+        if isinstance(body, (bytes, memoryview)):
+            client_socket.sendall(body)
+            return
+        if isinstance(body, FileRanges):
+            with body.file:
+                for part in body.parts:
+                    if isinstance(part, tuple):
+                        client_socket.sendfile(body.file, *part)
+                    else:
+                        client_socket.sendall(part)
+            return
+        # sendfile(2): the kernel copies from the page cache to the socket; the
+        # offset is explicit because cached descriptors share their file position
+        with body:
+            client_socket.sendfile(body, 0)
+
+
+def read_head(client_socket, buffer):
+    """Bytes up to the blank line, None when the client closes; the rest stays in buffer"""
+    while True:
+        end = buffer.find(b'\r\n\r\n')
+        if end >= 0:
+            head = bytes(buffer[:end])
+            del buffer[:end + 4]
+            return head
+        if len(buffer) > MAX_HEAD_SIZE:
+            raise BadRequest(431)
+        chunk = client_socket.recv(65536)
+        if not chunk:
+            return None
+        buffer += chunk
+
+
+def handle_request(client_socket):
+    client_socket.settimeout(KEEPALIVE_TIMEOUT)
+    buffer = bytearray()
+    try:
+        for handled in range(1, MAX_KEEPALIVE_REQUESTS + 1):
+            head = read_head(client_socket, buffer)
+            if head is None:
+                break
+            request = parse_request(head)
+            keep_alive = keeps_alive(request, handled)
+            send_response(client_socket, *make_response(request, keep_alive))
+            if not keep_alive:
+                break
+    except BadRequest as error:
+        send_error(client_socket.sendall, error)
+    except (socket.timeout, ConnectionError):
+        pass
     finally:
         client_socket.close()
 
 
-def start_server():
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_socket.bind((HOST, PORT))
-    server_socket.listen(5)
+def send_error(write, error):
+    try:
+        write(error_head(error.status, extra='Connection: close\r\n'))
+    except ConnectionError:
+        pass
 
-    print(f'Server is listening on {HOST}:{PORT}')
 
+def serve_threads(server_socket):
+    """Thread per connection"""
     while True:
         client_socket, addr = server_socket.accept()
         # print(f'Connection from {addr[0]}:{addr[1]}')
         threading.Thread(target=handle_request, args=(client_socket,)).start()
 
 
+async def read_request(reader):
+    """Next request of the connection, None when it is closed or idles out"""
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEPALIVE_TIMEOUT)
+    except asyncio.LimitOverrunError:
+        raise BadRequest(431) from None
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+        return None
+    return parse_request(head[:-4])
+
+
+async def handle_connection(reader, writer):
+    loop = asyncio.get_running_loop()
+    try:
+        for handled in range(1, MAX_KEEPALIVE_REQUESTS + 1):
+            request = await read_request(reader)
+            if request is None:
+                break
+            keep_alive = keeps_alive(request, handled)
+            file_path = resolve_path(request.path) if request.method in METHODS else None
+            entry = file_cache.peek(file_path) if file_path else None
+            if entry is None and file_path:
+                # stat() and open() block, they run in the bounded default executor
+                entry = await loop.run_in_executor(None, file_cache.get, file_path)
+            if entry is not None and needs_compression(request, entry):
+                await loop.run_in_executor(None, compress, entry)
+            entry = negotiate(request, entry)
+            await write_response(writer, *build_response(request, entry, keep_alive))
+            if not keep_alive:
+                break
+    except BadRequest as error:
+        send_error(writer.write, error)
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def write_response(writer, head, body):
+    loop = asyncio.get_running_loop()
+    with corked(writer.get_extra_info('socket')):
+        writer.write(head)
+        if body is None or isinstance(body, (bytes, memoryview)):
+            if body:
+                writer.write(body)
+            await writer.drain()
+            return
+        if isinstance(body, FileRanges):
+            with body.file:
+                for part in body.parts:
+                    if isinstance(part, tuple):
+                        await loop.sendfile(writer.transport, body.file, *part)
+                    else:
+                        writer.write(part)
+                await writer.drain()
+            return
+        # loop.sendfile() flushes the head first, then uses os.sendfile()
+        with body:
+            await loop.sendfile(writer.transport, body, 0)
+
+
+async def serve_async(server_socket, pool_size=POOL_SIZE):
+    """
+    One event loop (epoll on Linux) multiplexing all connections, an idle connection
+    costs a socket and a coroutine instead of a thread
+    """
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=pool_size))
+    server = await asyncio.start_server(handle_connection, sock=server_socket, limit=MAX_HEAD_SIZE)
+
+    async with server:
+        await server.serve_forever()
+
+
+def serve(server_socket, engine='async', pool_size=POOL_SIZE):
+    if engine == 'threads':
+        serve_threads(server_socket)
+    else:
+        asyncio.run(serve_async(server_socket, pool_size))
+
+
+def create_listener(host=HOST, port=PORT, backlog=BACKLOG, reuse_port=False):
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    server_socket.bind((host, port))
+    server_socket.listen(backlog)
+    return server_socket
+
+
+def run_workers(listeners, serve_one):
+    """
+    Forks a worker process per listening socket and restarts the ones that die;
+    SIGTERM and SIGINT stop the workers, then the master
+    """
+    children = {}
+    stopping = False
+
+    def spawn(index):
+        # a stop signal waits until the child is recorded and has the default handlers
+        signal.pthread_sigmask(signal.SIG_BLOCK, STOP_SIGNALS)
+        try:
+            pid = os.fork()
+            if pid == 0:
+                for signum in STOP_SIGNALS:
+                    signal.signal(signum, signal.SIG_DFL)
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+                for other in set(listeners) - {listeners[index]}:
+                    other.close()
+                try:
+                    serve_one(listeners[index])
+                except BaseException:
+                    # os._exit() skips the report of an uncaught exception
+                    print(f'Worker {os.getpid()} failed:', file=sys.stderr)
+                    traceback.print_exc()
+                finally:
+                    sys.stderr.flush()
+                    os._exit(1)
+            children[pid] = index, time.monotonic()
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                # reaped by os.wait(), not yet removed from children
+                pass
+
+    for signum in STOP_SIGNALS:
+        signal.signal(signum, stop)
+    for index in range(len(listeners)):
+        spawn(index)
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        index, started = children.pop(pid)
+        if not stopping and time.monotonic() - started < RESPAWN_DELAY:
+            time.sleep(RESPAWN_DELAY)
+        if not stopping:
+            spawn(index)
+
+
+def raise_nofile_limit():
+    """Every connection holds a descriptor, lift the soft limit up to the hard one"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def start_server(host=HOST, port=PORT, backlog=BACKLOG, engine='async', pool_size=POOL_SIZE,
+                 workers=WORKERS):
+    """
+    With several workers every process gets its own SO_REUSEPORT socket, so the kernel
+    spreads connections over the accept queues; without SO_REUSEPORT the workers share
+    one inherited socket. All sockets are bound here, before the fork, so a busy port
+    fails at once and a restarted worker takes over the queue of the one that died.
+    """
+    raise_nofile_limit()
+    if workers <= 1:
+        server_socket = create_listener(host, port, backlog)
+        print(f'Server is listening on {host}:{port}')
+        serve(server_socket, engine, pool_size)
+        return
+    if hasattr(socket, 'SO_REUSEPORT'):
+        listeners = [create_listener(host, port, backlog, reuse_port=True) for _ in range(workers)]
+    else:
+        listeners = [create_listener(host, port, backlog)] * workers
+    print(f'Server is listening on {host}:{port}, {workers} workers')
+    run_workers(listeners, lambda server_socket: serve(server_socket, engine, pool_size))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Static HTTP server')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--engine', choices=ENGINES, default='async')
+    parser.add_argument('--backlog', type=int, default=BACKLOG, help='listen() queue length')
+    parser.add_argument('--pool-size', type=int, default=POOL_SIZE,
+                        help='file system worker threads of the async engine')
+    parser.add_argument('-w', '--workers', type=int, default=WORKERS,
+                        help='processes, e.g. one per core; 1 serves in this process')
+    parser.add_argument('-r', '--document-root', default=DOCUMENT_ROOT)
+    parser.add_argument('--keepalive-timeout', type=float, default=KEEPALIVE_TIMEOUT,
+                        help='seconds an idle keep-alive connection is kept open')
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    start_server()
+    args = parse_args()
+    DOCUMENT_ROOT = args.document_root
+    KEEPALIVE_TIMEOUT = args.keepalive_timeout
+    start_server(args.host, args.port, args.backlog, args.engine, args.pool_size, args.workers)